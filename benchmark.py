@@ -0,0 +1,223 @@
+"""
+Benchmark the clustering engine over grids of n, k, dimension and modes.
+
+    python benchmark.py --n 1000 100000 --k 8 64 --dimension 3 32 \
+        --algorithm lloyd hamerly --output results.json
+
+Every row records the dataset, the KMeans options, setup time (point
+buffer, projection and metric caches), seeding time, mean assignment and
+update time per iteration, total fit time, iteration count, inertia and
+the peak traced memory of a separate untimed fit. Runs in a reduced
+precision dtype also report how far they drift from the float64 fit of
+the same seed, and add the 'shifted' dataset, uniform points far from the
+origin, to the default datasets. Results are written as JSON or CSV (by
+file extension) together with the current git commit so runs of different
+commits can be compared.
+"""
+import argparse
+import csv
+import itertools as it
+import json
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+from sklearn.datasets import make_blobs
+from submodules.cluster import KMeans, generate_vertices, labelled_inertia, \
+    row_distances
+from submodules.generators import generate_points
+from submodules.instrumentation import IterationLog
+
+
+# offset of the 'shifted' dataset, far enough from the origin that float32
+# norms swamp the distances between points
+SHIFT = 1000.0
+
+
+def make_dataset(kind, n, k, dimension, seed):
+    """Return an (n, d) point array of the given kind"""
+    if kind == 'vertices':
+        if dimension not in (2, 3):
+            raise ValueError("generate_vertices only makes 2D or 3D points")
+        points = np.array(generate_vertices(n, 4, three_d=dimension == 3,
+                                            seed=seed))
+        return points[:, :dimension]
+    if kind == 'shifted':
+        return generate_points(n, 'uniform', dimension, seed=seed) + SHIFT
+    if kind == 'anisotropic':
+        return generate_points(n, kind, dimension, seed=seed, centers=k)
+    if kind != 'blobs':
+        return generate_points(n, kind, dimension, seed=seed)
+    points, _ = make_blobs(n_samples=n, n_features=dimension, centers=k,
+                           random_state=seed)
+    return points
+
+
+class TimedKMeans(KMeans):
+    """KMeans that records the wall time of its center seeding"""
+
+    seeding_seconds = 0.0
+
+    def pick_center_points(self) -> list:
+        start = time.perf_counter()
+        centers = KMeans.pick_center_points(self)
+        self.seeding_seconds = time.perf_counter() - start
+        return centers
+
+
+def peak_memory(points, k, max_iterations, seed, **options) -> int:
+    """Return the peak traced memory of a fit, run apart from the timed fit
+    since tracing slows down every allocation"""
+    tracemalloc.start()
+    try:
+        KMeans(points, k, seed=seed, **options).fit(max_iterations)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(points, k, max_iterations, seed, measure_memory=True,
+             **options) -> tuple:
+    """Fit one KMeans, timing every phase, and return it together with the
+    measurements. The peak memory comes from a second, untimed fit"""
+    log = IterationLog()
+    start = time.perf_counter()
+    kmeans = TimedKMeans(points, k, seed=seed, callbacks=[log], **options)
+    setup = time.perf_counter() - start - kmeans.seeding_seconds
+    kmeans.fit(max_iterations)
+    total = time.perf_counter() - start
+    iterations = max(len(log), 1)
+    memory = peak_memory(points, k, max_iterations, seed, **options) \
+        if measure_memory else None
+    return kmeans, {
+        'setup_seconds': setup,
+        'seeding_seconds': kmeans.seeding_seconds,
+        'assignment_seconds': (log.total_seconds('assign') +
+                               log.total_seconds('sync')) / iterations,
+        'update_seconds': log.total_seconds('update') / iterations,
+        'total_seconds': total,
+        'iterations': kmeans.iterations,
+        'converged': kmeans.converged,
+        'distance_evaluations': int(sum(kmeans.distance_counts)),
+        'inertia': kmeans.inertia,
+        'peak_memory_bytes': memory,
+    }
+
+
+def precision_drift(points, kmeans, reference) -> dict:
+    """
+    Compare a fit with its float64 reference: the relative inertia
+    difference measured in float64, the largest distance between matching
+    centers and the fraction of points with the same label
+    """
+    centers = kmeans.centers.astype(float)
+    inertia = labelled_inertia(np.asarray(points, dtype=float), centers,
+                               kmeans.labels)
+    return {
+        'inertia_drift': abs(inertia - reference.inertia) /
+        max(reference.inertia, np.finfo(float).tiny),
+        'center_drift': float(row_distances(centers,
+                                            reference.centers).max()),
+        'label_agreement': float(np.mean(kmeans.labels == reference.labels)),
+    }
+
+
+def run_grid(sizes, clusters, dimensions, datasets, algorithms, inits,
+             workers, max_iterations=100, repeat=1, seed=0,
+             dtypes=('float64',)) -> list:
+    """Run every combination of the grid and return one row per run"""
+    rows = []
+    for kind, n, k, dimension in it.product(datasets, sizes, clusters,
+                                            dimensions):
+        if kind == 'vertices' and dimension not in (2, 3):
+            continue
+        points = make_dataset(kind, n, k, dimension, seed)
+        for algorithm, init, worker_count, run in it.product(
+                algorithms, inits, workers, range(repeat)):
+            options = dict(algorithm=algorithm, init=init,
+                           workers=worker_count)
+            reference = None
+            for dtype in dtypes:
+                row = {'dataset': kind, 'n': len(points), 'k': k,
+                       'dimension': dimension, 'algorithm': algorithm,
+                       'init': init, 'workers': worker_count,
+                       'dtype': dtype, 'run': run}
+                kmeans, measurements = run_case(points, k, max_iterations,
+                                                seed + run, dtype=dtype,
+                                                **options)
+                row.update(measurements)
+                if np.dtype(dtype) == np.float64:
+                    reference = kmeans
+                elif reference is None:
+                    # untimed float64 fit of the same seed to compare with
+                    reference, _ = run_case(points, k, max_iterations,
+                                            seed + run, measure_memory=False,
+                                            **options)
+                row.update(precision_drift(points, kmeans, reference))
+                print(', '.join('{}={}'.format(key, round(value, 6) if
+                                               isinstance(value, float) else
+                                               value)
+                                for key, value in row.items()))
+                rows.append(row)
+    return rows
+
+
+def git_commit() -> str:
+    """Return the current git commit, or an empty string outside git"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def write_results(path, rows):
+    """Write rows to a .csv or .json file"""
+    commit = git_commit()
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as results:
+            writer = csv.DictWriter(results,
+                                    fieldnames=['commit'] + list(rows[0]))
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(dict(row, commit=commit))
+    else:
+        with open(path, 'w') as results:
+            json.dump({'commit': commit, 'results': rows}, results, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--n', type=int, nargs='+',
+                        default=[100, 1000, 10000, 100000])
+    parser.add_argument('--k', type=int, nargs='+', default=[3, 16])
+    parser.add_argument('--dimension', type=int, nargs='+', default=[3])
+    parser.add_argument('--dataset', nargs='+',
+                        choices=['blobs', 'vertices', 'triangular',
+                                 'uniform', 'anisotropic', 'shifted'])
+    parser.add_argument('--algorithm', nargs='+', default=['lloyd'],
+                        choices=KMeans.algorithms)
+    parser.add_argument('--init', nargs='+', default=['k-means++'],
+                        choices=list(KMeans.seeding_methods))
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    parser.add_argument('--dtype', nargs='+', default=['float64'],
+                        choices=['float64', 'float32'])
+    parser.add_argument('--max-iterations', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    arguments = parser.parse_args()
+    if arguments.dataset is None:
+        arguments.dataset = ['blobs']
+        if any(np.dtype(dtype) != np.float64 for dtype in arguments.dtype):
+            arguments.dataset.append('shifted')
+    rows = run_grid(arguments.n, arguments.k, arguments.dimension,
+                    arguments.dataset, arguments.algorithm, arguments.init,
+                    arguments.workers, arguments.max_iterations,
+                    arguments.repeat, arguments.seed, arguments.dtype)
+    write_results(arguments.output, rows)
+
+
+if __name__ == '__main__':
+    main()
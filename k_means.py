@@ -1,22 +1,59 @@
 from manim import *
-from submodules.cluster import SKLearnKMeans, generate_vertices, KMeans, PointCoord
+from submodules.cluster import SKLearnKMeans, generate_vertices
+from submodules.pipeline import cached_fit
 from submodules.screen_grid import ScreenGrid
-import itertools as it
-import random as rnd
 
 
 class KMeansScene(Scene):
 
+    # 'dots' draws one Dot per point, 'cloud' draws every point in a single
+    # point cloud mobject colored through its per point color array
+    point_backend = 'dots'
+    point_count = 60
+    num_clusters = 3
+    seed = 150
+    max_iterations = 200
+    # parts rendered by this scene, the render driver narrows them down to
+    # render chunks of one video in parallel: the opening, the iterations
+    # in [first, stop) and the closing
+    render_opening = True
+    iteration_range = (0, None)
+    render_closing = True
+
+    @classmethod
+    def fit_trace(cls) -> tuple:
+        """
+        Return the points, a KMeans at the start of the fit and the fit's
+        FitHistory. The fit is recorded once and cached, every scene and
+        re-render replays the same trace
+        """
+        points = generate_vertices(cls.point_count, 4, seed=cls.seed)
+        return (points,) + cached_fit(points, cls.num_clusters,
+                                      seed=cls.seed,
+                                      max_iterations=cls.max_iterations)
+
     def setup(self):
         """All necessary variable initialization"""
-        self.points = generate_vertices(60, 4, seed=150)
-        self.num_clusters = 3
-        self.kmeans = KMeans(self.points, self.num_clusters)
+        self.rng = np.random.default_rng(self.seed)
+        self.points, self.kmeans, self.history = self.fit_trace()
         self.grid = ScreenGrid()
 
     def construct(self):
         """Animations to run"""
         self.post_set_up()
+        first, stop = self.iteration_range
+        if self.render_opening:
+            self.play_opening()
+        else:
+            # pick up where the previous chunk of the video stopped
+            self.add(self.dots_group, self.grid)
+            self.place_centers(self.history.centers_before(first))
+        self.play_iterations(first, stop)
+        if self.render_closing:
+            self.play_closing()
+
+    def play_opening(self):
+        """Show the points, the grid and the initial cluster centers"""
         self.wait()
         self.play(FadeIn(self.dots_group))
         self.play(Write(self.grid))
@@ -25,7 +62,10 @@ class KMeansScene(Scene):
         self.play(*self.initialize_centers(), run_time=3, rate_func=slow_into)
         self.wait(2)
         self.next_section()
-        for _ in self.kmeans.iterate_cluster(200):
+
+    def play_iterations(self, first=0, stop=None):
+        """Animate the recorded iterations in [first, stop)"""
+        for _ in self.history.replay(self.kmeans, first, stop):
             for cluster_key in self.kmeans.clusters_dictionary:
                 self.play(self.set_cluster_color(cluster_key))
                 self.wait()
@@ -35,6 +75,9 @@ class KMeansScene(Scene):
                     run_time=3, rate_func=slow_into)
             self.play(*self.reset_clusters())
             self.wait(1.2)
+
+    def play_closing(self):
+        """Color the final clusters and indicate their centers"""
         for cluster_key in self.kmeans.clusters_dictionary:
             self.play(self.set_cluster_color(cluster_key))
             self.wait()
@@ -46,13 +89,27 @@ class KMeansScene(Scene):
         )
         self.wait(2)
 
+    def place_centers(self, centers):
+        """Put the center marks at the screen positions of the given
+        centers without animating them"""
+        for key, position in enumerate(
+                self.kmeans.point_set.projection.project(centers)):
+            self.add(self.centers[key].move_to(position))
+
     def post_set_up(self):
         self.cluster_colors = self.clusters_color_range
         self.colors_dictionary = self.colors_dict
         self.centers = self.get_center_objects
-        dots = list(it.chain(*self.get_point_objects.values()))
-        rnd.shuffle(dots)
-        self.dots_group = VGroup(*dots)
+        if self.point_backend == 'cloud':
+            self.point_cloud = self.get_point_cloud()
+            self.dots_group = self.point_cloud
+            return
+        # stable point index to Dot mapping, the group order is shuffled
+        self.point_dots = self.get_point_objects()
+        self.dot_array = self.index_dots(self.point_dots)
+        # point indices in the shuffled order of the group
+        self.dot_order = self.rng.permutation(len(self.dot_array))
+        self.dots_group = VGroup(*self.dot_array[self.dot_order])
 
     def resize_screen(self, width):
         """Resize screen ratio"""
@@ -68,30 +125,54 @@ class KMeansScene(Scene):
         return color_gradient([BLUE, GREEN, ORANGE, PURPLE, YELLOW],
                               len(self.kmeans.clusters_dictionary))
 
-    @property
     def get_point_objects(self, scale=0.5):
-        """Map a coordinate tuple to object position"""
-        return {coord: Dot(color=GREY, point=point.point_to_np,
-                           radius=0.2).scale(scale) for coord, point in
-                self.kmeans.points_dictionary.items()}
+        """Map a point index to object position"""
+        return {index: Dot(color=GREY, point=point.point_to_np,
+                           radius=0.2).scale(scale) for index, point in
+                enumerate(self.kmeans.point_set)}
+
+    def get_point_cloud(self, stroke_width=4):
+        """Return one point cloud mobject holding every point in GREY"""
+        cloud = PMobject(stroke_width=stroke_width)
+        cloud.add_points(self.kmeans.point_set.projected(), color=GREY)
+        return cloud
+
+    def recolor_points(self, mask, color):
+        """Return a single animation setting the color of the point cloud
+        entries selected by mask"""
+        target = self.point_cloud.copy()
+        target.rgbas[mask] = color_to_rgba(color)
+        return Transform(self.point_cloud, target)
+
+    @staticmethod
+    def index_dots(point_dots):
+        """Return an object array holding the Dot of every point index, so
+        index arrays select Dots in one step"""
+        dot_array = np.empty(len(point_dots), dtype=object)
+        for index, dot in point_dots.items():
+            dot_array[index] = dot
+        return dot_array
 
     def get_cluster_points(self):
         """Return current cluster state"""
         return {key: cluster.points for key, cluster in
                 self.kmeans.clusters_dictionary.items()}
 
-    def get_cluster_group(self, cluster_key):
-        """Return a Vector Group of cluster objects"""
-        # get cluster instance
-        cluster_instance = self.kmeans.clusters_dictionary[cluster_key]
-        # group objects of cluster
-        return VGroup(*[obj for obj in self.dots_group if PointCoord(
-            *obj.get_center()) in cluster_instance.points])
+    def get_cluster_group(self, cluster_key, labels=None):
+        """
+        Return a Vector Group of the Dots labelled with the cluster key,
+        by the current labels of the engine unless labels are given
+        """
+        labels = self.kmeans.labels if labels is None else labels
+        return VGroup(*self.dot_array[np.asarray(labels) == cluster_key])
 
     def set_cluster_color(self, cluster_key):
         """Set color of cluster objects"""
         # get cluster color
         color = self.cluster_color(cluster_key)
+        if self.point_backend == 'cloud':
+            return self.recolor_points(self.kmeans.labels == cluster_key,
+                                       color)
         # get cluster group
         cluster_group = self.get_cluster_group(cluster_key)
         # apply color method to group
@@ -99,8 +180,9 @@ class KMeansScene(Scene):
 
     def reset_clusters(self):
         """Reset clusters"""
-        return [ApplyMethod(obj.set_color, GREY) for obj in
-                self.dots_group]
+        if self.point_backend == 'cloud':
+            return [self.recolor_points(slice(None), GREY)]
+        return [ApplyMethod(self.dots_group.set_color, GREY)]
 
     @staticmethod
     def center_object(color, scale=0.5):
@@ -149,56 +231,61 @@ class KMeansScene(Scene):
         self.play(animation(data), run_time=6, rate_func=rush_from)
 
 
+class KMeansCloudScene(KMeansScene):
+    """KMeansScene over a large dataset drawn as one point cloud"""
+
+    point_backend = 'cloud'
+    point_count = 20000
+
+
 class AssignPoint(KMeansScene):
     def construct(self):
         self.play(Write(self.grid))
         self.post_set_up()
+        self.set_distance_table()
         self.play(FadeIn(self.dots_group))
         self.play(*self.initialize_centers())
 
-        # get all lines from each cluster to each of the points
-        self.lines = [self.group_point_cluster_lines(point) for point in
-                      self.dots_group]
-        self.ref_lines_group = self.lines[0]
-
-        # get initial distances dictionary
+        # distances from the current point to every cluster center
         self.get_distances()
-        self.set_update_all_cluster_distances()
-
-        # add updaters for all lines
         display_distances = VGroup(*self.distances.values()).arrange(RIGHT,
                                                                      buff=0.9*self.camera.frame_width/self.num_clusters)
         display_distances.to_edge(DOWN, buff=0.2)
 
-        index = 0
-        # fade in lines from cluster centers to first point
         self.wait(2)
         self.add(display_distances)
         self.wait(2)
-        for index, point in enumerate(self.dots_group):
-            min_line = self.get_shortest_distance(point)
-
-            # manipulate updaters
-            def manipulate_updaters():
-                self.suspend_all_cluster_distance_updaters()
-                self.play(self.wiggle_minimum(min_line))
-                self.wait(0.1)
-                self.play(self.classify_point(self.dots_group[index],
-                                              min_line), run_time=0.4)
-                self.resume_all_cluster_point_distance_updaters()
-
-            if index == 0:
-                self.play(Write(self.ref_lines_group), run_time=3)
-                manipulate_updaters()
-                pass
+        # lines are only built for the point being assigned
+        self.ref_lines_group = None
+        for index in self.dot_order:
+            point = self.dot_array[index]
+            lines = self.group_point_cluster_lines(point)
+            if self.ref_lines_group is None:
+                self.ref_lines_group = lines
+                self.play(Write(self.ref_lines_group),
+                          *self.show_distances(index), run_time=3)
             else:
-                self.play(Transform(self.ref_lines_group, self.lines[index]))
-                manipulate_updaters()
+                self.play(Transform(self.ref_lines_group, lines),
+                          *self.show_distances(index))
+            min_line = self.get_shortest_distance(index)
+            self.play(self.wiggle_minimum(min_line))
+            self.wait(0.1)
+            self.play(self.classify_point(point, min_line), run_time=0.4)
         self.wait(1)
 
+    def set_distance_table(self):
+        """
+        Compute the (n, k) point to center distances and the closest center
+        of every point once, against the centers the points are assigned to
+        """
+        self.distance_table = self.kmeans.transform()
+        self.closest_centers = np.argmin(self.distance_table, axis=1)
+
     def pick_points(self, k):
         """pick k points from a sample"""
-        return rnd.sample(list(self.dots_group), k)
+        dots = list(self.dots_group)
+        return [dots[index] for index in
+                self.rng.choice(len(dots), size=k, replace=False)]
 
     def draw_lines(self, point):
         """Return a dictionary of distance lines with keys as cluster keys"""
@@ -213,43 +300,22 @@ class AssignPoint(KMeansScene):
         cluster centers to a point"""
         return VGroup(*self.draw_lines(point).values())
 
-    def get_shortest_distance(self, point):
-        """Return shortest distance from the cluster point line"""
-        lines = self.draw_lines(point)
-        return min(lines.keys(), key=(lambda d: lines[d].get_length()))
+    def get_shortest_distance(self, index):
+        """Return the key of the cluster center closest to the point at
+        the given index"""
+        return int(self.closest_centers[index])
 
     def get_distances(self):
         """Get a dictionary of distances with keys as cluster keys"""
         self.distances = {key: DecimalNumber().scale(0.5).set_color(self.cluster_color(
             key)) for key in self.kmeans.clusters_dictionary}
 
-    def update_cluster_point_distance(self, key):
-        """Update each distance to the cluster from point"""
-        self.distances[key].add_updater(
-            lambda d: d.set_value(self.ref_lines_group.submobjects[
-                                      key].get_length()))
-
-    def suspend_cluster_point_distance_updater(self, key):
-        # remove updater of cluster-point line
-        self.distances[key].suspend_updating()
-
-    def resume_cluster_point_distance_updater(self, key):
-        # resume updater of all cluster-point lines
-        self.distances[key].resume_updating()
-
-    def resume_all_cluster_point_distance_updaters(self):
-        [self.resume_cluster_point_distance_updater(key) for key in
-         self.kmeans.clusters_dictionary]
-
-    def set_update_all_cluster_distances(self):
-        """Update all cluster to point distances"""
-        for key in self.kmeans.clusters_dictionary:
-            self.update_cluster_point_distance(key)
-
-    def suspend_all_cluster_distance_updaters(self):
-        """remove all cluster to point distances updaters"""
-        [self.suspend_cluster_point_distance_updater(key) for key in
-         self.kmeans.clusters_dictionary]
+    def show_distances(self, index):
+        """Return animations moving the displayed distances to those of the
+        point at the given index"""
+        return [ChangeDecimalToValue(self.distances[key],
+                                     self.distance_table[index, key])
+                for key in self.distances]
 
     def initialize_centers(self):
         """move all cluster centers to their initial positions and fade them
@@ -278,6 +344,7 @@ class Introduction(AssignPoint):
 
     def construct(self):
         self.post_set_up()
+        self.set_distance_table()
 
         self.introduce_data(self.dots_group, ShowIncreasingSubsets)
         self.wait(3)
@@ -285,23 +352,13 @@ class Introduction(AssignPoint):
         self.play(*self.initialize_centers())
         self.wait(3)
 
-        for index, point in enumerate(self.dots_group):
-            min_line = self.get_shortest_distance(point)
+        for index in self.dot_order:
+            min_line = self.get_shortest_distance(index)
 
             self.play(
                 self.classify_point(
-                    self.dots_group[index],
+                    self.dot_array[index],
                     min_line),
                 run_time=0.4
             )
             self.wait(0.5)
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,129 @@
+"""
+Render a K-means scene of k_means.py in parallel chunks and join them.
+
+    python render.py KMeansScene --workers 8 --chunk-iterations 5 \
+        --quality low_quality --output kmeans.mp4
+
+The fit is recorded once (or read from the fit cache) before any worker
+starts. The video is then split into the opening, chunks of recorded
+iterations and the closing. Each chunk is rendered by its own manim scene
+in a process pool, starting from the recorded state of its first
+iteration, and the partial movies are joined with ffmpeg's concat demuxer
+without re-encoding. Only scenes rendered by KMeansScene.construct can be
+split, scenes like AssignPoint that build their own animation are
+rejected.
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+
+def scene_chunks(iterations: int, chunk_iterations: int) -> list:
+    """
+    Return the (render_opening, (first, stop), render_closing) settings of
+    every chunk, in video order. The opening and closing get chunks of
+    their own so the iteration chunks are all about the same length
+    """
+    chunks = [(True, (0, 0), False)]
+    for first in range(0, iterations, chunk_iterations):
+        chunks.append((False, (first, min(first + chunk_iterations,
+                                          iterations)), False))
+    chunks.append((False, (iterations, None), True))
+    return chunks
+
+
+def chunked_scene(scene_name):
+    """
+    Return the scene class of k_means.py with the given name. Only scenes
+    rendered by KMeansScene.construct follow the chunk settings, scenes
+    with a construct of their own would be rendered whole by every chunk
+    """
+    import k_means
+    scene_class = getattr(k_means, scene_name, None)
+    if not isinstance(scene_class, type) or not issubclass(
+            scene_class, k_means.KMeansScene):
+        raise ValueError("{!r} is not a KMeansScene of k_means.py".format(
+            scene_name))
+    if scene_class.construct is not k_means.KMeansScene.construct:
+        raise ValueError(
+            "scene {!r} overrides construct and cannot be rendered in "
+            "chunks, render it with manim directly".format(scene_name))
+    return scene_class
+
+
+def render_chunk(scene_name, index, chunk, quality, media_dir) -> str:
+    """Render one chunk of a scene and return its movie file path"""
+    from manim import tempconfig
+    render_opening, iteration_range, render_closing = chunk
+    name = '{}Chunk{:04d}'.format(scene_name, index)
+    # a class per chunk keeps the partial movie files of chunks apart
+    scene_class = type(name, (chunked_scene(scene_name),), {
+        'render_opening': render_opening,
+        'iteration_range': iteration_range,
+        'render_closing': render_closing,
+    })
+    with tempconfig({'quality': quality, 'media_dir': media_dir,
+                     'output_file': name}):
+        scene = scene_class()
+        scene.render()
+        return scene.renderer.file_writer.movie_file_path
+
+
+def join_movies(paths, output):
+    """Concatenate movie files of the same encoding into output"""
+    with tempfile.NamedTemporaryFile('w', suffix='.txt',
+                                     delete=False) as listing:
+        for path in paths:
+            listing.write("file '{}'\n".format(os.path.abspath(path)))
+    try:
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat',
+                        '-safe', '0', '-i', listing.name, '-c', 'copy',
+                        output], check=True)
+    finally:
+        os.remove(listing.name)
+    return output
+
+
+def render_parallel(scene_name, chunk_iterations=5, workers=None,
+                    quality='low_quality', media_dir='media',
+                    output=None) -> str:
+    """Render a scene of k_means.py chunk by chunk on a process pool and
+    return the joined movie path"""
+    scene_class = chunked_scene(scene_name)
+    # record the fit once so every worker reads it from the cache
+    _, _, history = scene_class.fit_trace()
+    chunks = scene_chunks(history.iterations, chunk_iterations)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        paths = list(pool.map(render_chunk, [scene_name] * len(chunks),
+                              range(len(chunks)), chunks,
+                              [quality] * len(chunks),
+                              [media_dir] * len(chunks)))
+    return join_movies(paths, output or '{}.mp4'.format(scene_name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('scene', help="KMeansScene class of k_means.py "
+                                      "that renders a recorded fit")
+    parser.add_argument('--chunk-iterations', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--quality', default='low_quality',
+                        choices=['low_quality', 'medium_quality',
+                                 'high_quality', 'production_quality',
+                                 'fourk_quality'])
+    parser.add_argument('--media-dir', default='media')
+    parser.add_argument('--output', default=None)
+    arguments = parser.parse_args()
+    try:
+        chunked_scene(arguments.scene)
+    except ValueError as error:
+        parser.error(str(error))
+    print(render_parallel(arguments.scene, arguments.chunk_iterations,
+                          arguments.workers, arguments.quality,
+                          arguments.media_dir, arguments.output))
+
+
+if __name__ == '__main__':
+    main()
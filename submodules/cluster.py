@@ -1,9 +1,18 @@
+import os
+import numpy as np
 from numpy import array
-import random as rnd
+from concurrent.futures import ThreadPoolExecutor
 from math import sqrt
 import itertools as it
-from functools import reduce
+import scipy.sparse as sp
+from scipy.spatial import cKDTree
 from sklearn.datasets import make_blobs
+from submodules.point_store import save_checkpoint, load_checkpoint
+from submodules.projection import get_projection
+from submodules.instrumentation import IterationStats, PhaseTimer
+from submodules.generators import Triangular, generate_points
+from submodules.metrics import squared_distances, mean_from_sums, \
+    get_metric, row_norms, row_dots, dense_rows
 
 
 class PointCoord:
@@ -13,6 +22,8 @@ class PointCoord:
     If the z value is not supplied the PointCoord object lives in a 2D plane
     """
 
+    __slots__ = ('x', 'y', 'z')
+
     def __init__(self, x, y, z=0):
         self.x = x
         self.y = y
@@ -57,16 +68,277 @@ class PointCoord:
         return array((self.x, self.y, self.z))
 
 
+class PointSet:
+    """
+    Shared (n, d) coordinate buffer holding every point to be clustered.
+    PointCoord objects are the on-screen positions of the points given by
+    the projection, and are only created when a point is requested.
+    scipy.sparse input is kept as a CSR matrix
+    """
+
+    __slots__ = ('coordinates', 'projection', 'buffer', 'offset')
+
+    def __init__(self, pts, projection=None, dtype=None, center=None):
+        # float64 mean subtracted from the stored coordinates, None when
+        # they are stored as given
+        self.offset = None
+        if sp.issparse(pts):
+            if dtype is None and not np.issubdtype(pts.dtype, np.floating):
+                dtype = float
+            self.coordinates = sp.csr_matrix(pts, dtype=dtype)
+            self.projection = get_projection(projection).fit(
+                self.coordinates)
+            self.buffer = None
+            return
+        source = np.asarray(pts)
+        if source.ndim != 2:
+            source = source.reshape(len(source), -1)
+        if dtype is None:
+            dtype = source.dtype if np.issubdtype(
+                source.dtype, np.floating) else float
+        if center is None:
+            # centering only pays off below float64 precision
+            center = np.dtype(dtype).itemsize < 8
+        if center:
+            # distances expand into norms minus dot products, which cancel
+            # in float32 on points far from the origin. Points stored
+            # around their float64 mean keep the norms small
+            self.offset = source.mean(axis=0, dtype=np.float64)
+            self.coordinates = np.empty(source.shape, dtype=dtype)
+            np.subtract(source, self.offset, out=self.coordinates,
+                        casting='same_kind')
+        else:
+            # floating arrays of the requested dtype, memory maps included,
+            # are used without a copy
+            self.coordinates = np.ascontiguousarray(source, dtype=dtype)
+        self.projection = get_projection(projection).fit(
+            source if center else self.coordinates)
+        # owned storage with spare rows, created on the first append or
+        # remove so input arrays and memory maps are never written to
+        self.buffer = None
+
+    def __len__(self):
+        return self.coordinates.shape[0]
+
+    def __getitem__(self, index) -> PointCoord:
+        return self.point_coord(self.coordinates[index])
+
+    def __iter__(self):
+        return (PointCoord(*row) for row in self.projected().tolist())
+
+    def projected(self, indices=None):
+        """Return the (m, 3) screen positions of the points at the given
+        indices, all points by default"""
+        if indices is None:
+            return self.projection.project(self.restore(self.coordinates))
+        return self.projection.project(
+            self.restore(self.coordinates[indices]))
+
+    def point_coord(self, vector) -> PointCoord:
+        """Return the PointCoord screen position of a d-dimensional vector
+        in the frame of the stored coordinates"""
+        return PointCoord(*self.projection.project(self.restore(vector))[0])
+
+    def restore(self, coordinates):
+        """Return stored coordinates in the frame of the input points"""
+        if self.offset is None:
+            return coordinates
+        return coordinates + self.offset
+
+    @property
+    def dimension(self) -> int:
+        """Number of coordinates per point"""
+        return self.coordinates.shape[1]
+
+    @property
+    def sparse(self) -> bool:
+        """Whether the points are held in a sparse matrix"""
+        return sp.issparse(self.coordinates)
+
+    def reserve(self, count: int):
+        """Make sure the owned buffer has room for count points"""
+        if self.sparse:
+            # CSR rows cannot be preallocated, sparse sets are rebuilt
+            return self
+        if self.buffer is None or len(self.buffer) < count:
+            buffer = np.empty((max(count, 2 * len(self)), self.dimension),
+                              dtype=self.coordinates.dtype)
+            buffer[:len(self)] = self.coordinates
+            self.buffer = buffer
+            self.coordinates = buffer[:len(self)]
+        return self
+
+    def append(self, pts):
+        """Add points, given in the frame of the stored coordinates, at the
+        end of the set and return their indices"""
+        start = len(self)
+        if self.sparse:
+            pts = sp.csr_matrix(pts, dtype=self.coordinates.dtype)
+            self.coordinates = sp.vstack((self.coordinates, pts),
+                                         format='csr')
+            return np.arange(start, len(self))
+        pts = np.asarray(pts, dtype=self.coordinates.dtype).reshape(
+            -1, self.dimension)
+        self.reserve(start + len(pts))
+        self.buffer[start:start + len(pts)] = pts
+        self.coordinates = self.buffer[:start + len(pts)]
+        return np.arange(start, start + len(pts))
+
+    def remove(self, indices):
+        """
+        Remove the points at the given indices, keeping the order of the
+        rest, and return the boolean mask of the kept points
+        """
+        keep = np.ones(len(self), dtype=bool)
+        keep[indices] = False
+        if self.sparse:
+            self.coordinates = self.coordinates[np.flatnonzero(keep)]
+            return keep
+        kept = self.coordinates[keep]
+        self.reserve(len(kept))
+        self.buffer[:len(kept)] = kept
+        self.coordinates = self.buffer[:len(kept)]
+        return keep
+
+    def view(self, indices):
+        """Return a PointView over the points at the given indices"""
+        return PointView(self, indices)
+
+
+class PointView:
+    """
+    Read-only sequence of PointCoord objects backed by an index array into
+    a PointSet
+    """
+
+    __slots__ = ('point_set', 'indices')
+
+    def __init__(self, point_set: PointSet, indices):
+        self.point_set = point_set
+        self.indices = indices
+
+    def __repr__(self):
+        return "PointView({} points)".format(len(self))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __bool__(self):
+        return len(self.indices) > 0
+
+    def __getitem__(self, index) -> PointCoord:
+        return self.point_set[self.indices[index]]
+
+    def __iter__(self):
+        return (self.point_set[index] for index in self.indices)
+
+    def __contains__(self, point):
+        """Check whether a screen position belongs to a viewed point"""
+        position = np.zeros(3)
+        given = np.ravel(
+            point.point_to_np if isinstance(point, PointCoord) else point)
+        position[:len(given)] = given
+        # projections of single rows and of whole arrays may differ in the
+        # last bits, so positions are matched with a tight tolerance
+        return bool(np.any(np.all(np.isclose(
+            self.point_set.projected(self.indices), position, rtol=1e-9,
+            atol=1e-12), axis=1)))
+
+    @property
+    def array(self):
+        """Return the coordinates of the viewed points as an (m, d) array"""
+        return self.point_set.restore(
+            self.point_set.coordinates[self.indices])
+
+
+class ClusterMembership:
+    """
+    Point labels grouped by cluster key. The indices of every cluster are
+    contiguous slices of a single array ordered by label, sorted on the
+    first lookup so fits that never read their clusters skip the sort
+    """
+
+    __slots__ = ('labels', 'k', 'sorted_order', 'sorted_bounds')
+
+    def __init__(self, labels, k):
+        self.labels = labels
+        self.k = k
+        self.sorted_order = None
+        self.sorted_bounds = None
+
+    def __len__(self):
+        return self.k
+
+    def __getitem__(self, key):
+        bounds = self.bounds
+        return self.order[bounds[key]:bounds[key + 1]]
+
+    @property
+    def order(self):
+        """Point indices sorted by label, stable within a cluster"""
+        if self.sorted_order is None:
+            self.sorted_order = np.argsort(self.labels, kind='stable')
+        return self.sorted_order
+
+    @property
+    def bounds(self):
+        """Start of every cluster's slice of order, and the end of the
+        last one"""
+        if self.sorted_bounds is None:
+            self.sorted_bounds = np.concatenate(
+                ([0], np.cumsum(np.bincount(self.labels, minlength=self.k))))
+        return self.sorted_bounds
+
+    @property
+    def counts(self):
+        """Number of points in every cluster"""
+        return np.diff(self.bounds)
+
+
+NO_POINTS = np.empty(0, dtype=np.intp)
+
+
 class Cluster:
     """
     Cluster object with PointCoord objects making up a cluster. If the z
     value if not defined, the Cluster object is made up of 2D PointCoord
-    objects
+    objects. The points are stored as indices into a shared PointSet and
+    the center is the screen position of the cluster mean
     """
 
-    def __init__(self, x, y, z=0):
+    __slots__ = ('center', 'point_set', 'point_indices', 'membership', 'key')
+
+    def __init__(self, x, y, z=0, point_set=None):
         self.center = PointCoord(x, y, z)
-        self.points = []
+        self.point_set = point_set
+        self.point_indices = NO_POINTS
+        # shared ClusterMembership the indices are read from on request
+        self.membership = None
+        self.key = None
+
+    @property
+    def indices(self):
+        """PointSet indices of the points in the cluster"""
+        if self.membership is not None:
+            self.point_indices = self.membership[self.key]
+            self.membership = None
+        return self.point_indices
+
+    @indices.setter
+    def indices(self, indices):
+        self.point_indices = indices
+        self.membership = None
+
+    def share_membership(self, membership: ClusterMembership, key: int):
+        """Take the cluster's indices from a ClusterMembership once they are
+        read"""
+        self.membership = membership
+        self.key = key
+
+    @property
+    def points(self) -> PointView:
+        """Lazy sequence of the PointCoord objects in the cluster"""
+        return PointView(self.point_set, self.indices)
 
     def update(self):
         """
@@ -77,35 +349,358 @@ class Cluster:
         """
 
         # check length of cluster
-        if len(self.points) > 1:
-            # get average of all points in self.points list
-            average = reduce(lambda x, y: x + y, self.points) * (
-                        1 / len(self.points))
+        if len(self.indices):
+            # get average of all points in the cluster and project it
+            self.center = self.point_set.point_coord(
+                self.point_set.coordinates[self.indices].mean(axis=0))
+        # an empty cluster keeps its current center
+
+    def add_point(self, index: int):
+        """Add the point at the given PointSet index to cluster points"""
+        self.indices = np.append(self.indices, index)
+
+    def reset_points(self):
+        """Remove all points from the cluster"""
+        self.indices = NO_POINTS
+
+
+def assign_labels(points, centers, chunk_size=65536, metric=None,
+                  prepared=False):
+    """
+    Return the index of the closest center for every point under the
+    metric, squared Euclidean by default. Points are processed in chunks
+    so the distance matrix stays small for large n. prepared tells the
+    metric that points are the dataset it cached per point data for
+    """
+    metric = metric or get_metric(None)
+    labels = np.empty(points.shape[0], dtype=np.intp)
+    for start in range(0, points.shape[0], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        labels[chunk] = metric.nearest(points[chunk], centers,
+                                       rows=chunk if prepared else None)
+    return labels
+
+
+def row_distances(points, centers):
+    """Return the Euclidean distance between each point and its paired
+    center"""
+    if sp.issparse(points):
+        distances = row_norms(points) - 2 * row_dots(points, centers) \
+            + row_norms(centers)
+        return np.sqrt(np.maximum(distances, 0, out=distances))
+    difference = points - centers
+    return np.sqrt(np.einsum('ij,ij->i', difference, difference))
+
+
+def center_separation(centers):
+    """
+    Return the (k, k) distances between all centers and, for every center,
+    half the distance to its closest other center
+    """
+    separation = np.sqrt(squared_distances(centers, centers))
+    np.fill_diagonal(separation, np.inf)
+    half_closest = 0.5 * separation.min(axis=1)
+    np.fill_diagonal(separation, 0)
+    return separation, half_closest
+
+
+def labelled_inertia(points, centers, labels, chunk_size=65536,
+                     metric=None, prepared=False):
+    """Return the sum of the distances of points to their labelled
+    centers, squared Euclidean by default, accumulated in float64"""
+    metric = metric or get_metric(None)
+    total = 0.0
+    for start in range(0, points.shape[0], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        total += float(metric.row_cost(
+            points[chunk], centers[labels[chunk]],
+            rows=chunk if prepared else None).sum(dtype=np.float64))
+    return total
+
+
+# below this many coordinates one bincount per column beats the one-hot
+# matrix product when summing dense points by label
+BINCOUNT_MAX_DIMENSION = 8
+
+
+def grouped_sums(points, labels, k):
+    """Return the (k, d) coordinate sums and the (k,) point counts of the
+    points grouped by label. The points are summed with a (k, n) float64
+    one-hot matrix product, or one bincount per column for few dense
+    columns. Both accumulate in float64 whatever the point dtype, which
+    keeps float32 means accurate"""
+    counts = np.bincount(labels, minlength=k)
+    if not sp.issparse(points) and points.shape[1] < BINCOUNT_MAX_DIMENSION:
+        sums = np.stack([np.bincount(labels, weights=points[:, dim],
+                                     minlength=k)
+                         for dim in range(points.shape[1])], axis=1)
+        return sums, counts
+    one_hot = sp.csr_matrix(
+        (np.ones(len(labels)), (labels, np.arange(len(labels)))),
+        shape=(k, points.shape[0]))
+    sums = one_hot @ points
+    return (sums.toarray() if sp.issparse(sums) else sums), counts
+
+
+def grouped_mean(points, labels, centers):
+    """
+    Return the mean of the points assigned to each center. Centers without
+    any assigned points keep their current position
+    """
+    return mean_from_sums(*grouped_sums(points, labels, len(centers)),
+                          centers)
+
+
+def assign_chunk(points, centers, chunk, metric=None):
+    """
+    Label one slice of the dataset the metric was prepared on and return
+    the labels together with the partial sums and counts of the slice
+    """
+    labels = (metric or get_metric(None)).nearest(points[chunk], centers,
+                                                  rows=chunk)
+    return (labels,) + grouped_sums(points[chunk], labels, len(centers))
+
+
+def online_update(centers, center_counts, points, labels):
+    """
+    Move centers in place towards the mean of their newly labelled points,
+    with a learning rate of one over the number of points each center has
+    absorbed so far. center_counts is updated in place as well
+    """
+    sums, counts = grouped_sums(points, labels, len(centers))
+    center_counts += counts
+    seen = counts > 0
+    # c += (sum - m * c) / count is m sequential steps with rate 1/count
+    centers[seen] += (sums[seen] - counts[seen, None] * centers[seen]) \
+        / center_counts[seen, None]
+    return centers
+
+
+def random_centers(points, k, rng, weights=None):
+    """Return k distinct points drawn uniformly (or by weight) as centers"""
+    probabilities = None if weights is None else weights / weights.sum()
+    return dense_rows(points, rng.choice(points.shape[0], size=k,
+                                         replace=False, p=probabilities))
+
+
+def kmeans_plus_plus(points, k, rng, weights=None, trials=None):
+    """
+    Return k centers picked by k-means++: every new center is drawn with a
+    probability proportional to its weighted squared distance from the
+    closest center picked so far. Each draw tries a few candidates and
+    keeps the one that lowers the total squared distance the most
+    """
+    n = points.shape[0]
+    weights = np.ones(n) if weights is None else weights
+    trials = trials or 2 + int(np.log(k))
+    centers = np.empty((k, points.shape[1]))
+    centers[0] = dense_rows(points, rng.choice(n, p=weights / weights.sum()))
+    closest = squared_distances(points, centers[:1])[:, 0] * weights
+    for index in range(1, k):
+        cumulative = np.cumsum(closest)
+        if cumulative[-1] <= 0:
+            # every point coincides with a center, fall back to any point
+            candidates = rng.integers(n, size=trials)
         else:
-            # if length is 1 get the only point in the list
-            average = (self.center.x, self.center.y, self.center.z)
-        # update center
-        self.center = PointCoord(*average)
+            candidates = np.searchsorted(
+                cumulative, rng.random(trials) * cumulative[-1])
+            candidates = np.minimum(candidates, n - 1)
+        candidate_rows = dense_rows(points, candidates)
+        candidate_closest = np.minimum(
+            closest[None, :],
+            squared_distances(points, candidate_rows).T * weights)
+        best = np.argmin(candidate_closest.sum(axis=1))
+        centers[index] = candidate_rows[best]
+        closest = candidate_closest[best]
+    return centers
 
-    # add PointCoord(x, y, z) object to cluster
-    def add_point(self, point: PointCoord):
-        """Add point to cluster points"""
-        self.points.append(point)
+
+def kmeans_parallel(points, k, rng, oversampling=None, rounds=5):
+    """
+    Return k centers picked by k-means||: a few rounds each sample every
+    point independently with probability proportional to its squared
+    distance from the current candidates, then the weighted candidates are
+    reduced to k centers with k-means++
+    """
+    oversampling = oversampling or 2 * k
+    n = points.shape[0]
+    candidates = dense_rows(points, rng.integers(n, size=1))
+    closest = squared_distances(points, candidates)[:, 0]
+    for _ in range(rounds):
+        potential = closest.sum()
+        if potential <= 0:
+            break
+        picked = np.flatnonzero(
+            rng.random(n) < oversampling * closest / potential)
+        if not len(picked):
+            continue
+        picked = dense_rows(points, picked)
+        candidates = np.concatenate((candidates, picked))
+        np.minimum(closest, squared_distances(points, picked).min(axis=1),
+                   out=closest)
+    if len(candidates) <= k:
+        # too few distinct candidates, top up with uniformly drawn points
+        extra = dense_rows(points, rng.choice(n, size=k - len(candidates),
+                                              replace=False))
+        return np.concatenate((candidates, extra))
+    # weight each candidate by the number of points closest to it
+    weights = np.bincount(assign_labels(points, candidates),
+                          minlength=len(candidates)).astype(float)
+    weights[weights == 0] = np.finfo(float).eps
+    return kmeans_plus_plus(candidates, k, rng, weights=weights)
 
 
 class KMeans:
-    def __init__(self, pts: list, k: int):
+    """
+    Lloyd's algorithm over a shared point buffer. The 'hamerly' and 'elkan'
+    algorithms keep triangle inequality bounds on the point to center
+    distances so settled points skip the distance computation. Points may
+    be a scipy.sparse matrix, which is clustered as CSR against dense
+    centers
+    """
+
+    algorithms = ('lloyd', 'hamerly', 'elkan')
+    # predict queries a KD-tree over the centers from this many clusters
+    # on, for batches of at least tree_min_batch points in at most
+    # tree_max_dimension dimensions. Smaller batches, fewer clusters or
+    # more dimensions are faster with the distance kernel
+    tree_min_clusters = 256
+    tree_min_batch = 1000
+    tree_max_dimension = 4
+    empty_cluster_strategies = ('farthest', 'split', 'keep')
+    seeding_methods = {
+        'random': random_centers,
+        'k-means++': kmeans_plus_plus,
+        'k-means||': kmeans_parallel,
+    }
+
+    def __init__(self, pts, k: int, algorithm='lloyd', init='k-means++',
+                 seed=None, workers=1, chunk_size=65536, projection=None,
+                 tol=0.0, inertia_tol=None, reassign_tol=0,
+                 empty_cluster='farthest', callbacks=None,
+                 metric='sqeuclidean', dtype=None, center_points=None):
+        if algorithm not in self.algorithms:
+            raise ValueError("algorithm must be one of {}, got {!r}".format(
+                self.algorithms, algorithm))
+        if isinstance(init, str) and init not in self.seeding_methods:
+            raise ValueError("init must be one of {}, got {!r}".format(
+                tuple(self.seeding_methods), init))
+        if empty_cluster not in self.empty_cluster_strategies:
+            raise ValueError(
+                "empty_cluster must be one of {}, got {!r}".format(
+                    self.empty_cluster_strategies, empty_cluster))
+        self.metric = get_metric(metric)
+        if algorithm != 'lloyd' and not self.metric.bounded:
+            raise ValueError(
+                "algorithm {!r} needs Euclidean distances, use 'lloyd' with "
+                "the {!r} metric".format(algorithm, self.metric.name))
+        if dtype is not None and not np.issubdtype(dtype, np.floating):
+            raise ValueError(
+                "dtype must be a floating type, got {!r}".format(dtype))
+        if sp.issparse(pts) and not self.metric.sparse:
+            raise ValueError("the {!r} metric does not support sparse "
+                             "points".format(self.metric.name))
         self.k = k
-        self.points = pts
-        self.points_dictionary = self.points_dict()
+        self.algorithm = algorithm
+        self.init = init
+        # convergence criteria, any one of them stops iterate_cluster
+        self.tol = tol
+        self.inertia_tol = inertia_tol
+        self.reassign_tol = reassign_tol
+        self.empty_cluster = empty_cluster
+        # called with an IterationStats after every iteration, callbacks
+        # with a true inertia attribute ask for the inertia of every
+        # assignment as well
+        self.callbacks = list(callbacks or [])
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        # threads sharing the lloyd assignment and update step
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        if not self.metric.shift_invariant or sp.issparse(pts):
+            center_points = False
+        # contiguous (n, d) buffer shared by all Cluster objects
+        self.point_set = PointSet(self.metric.normalize_points(pts),
+                                  projection, dtype, center_points)
+        self.metric.prepare(self.points_array)
+        # points and centers are stored in dtype, float32 halves the memory
+        # traffic of the assignment step, while cluster sums stay float64.
+        # Without a dtype floating input, a float32 point file included,
+        # keeps its own. Below float64 the points and centers are stored
+        # around the mean of the points unless center_points is False,
+        # which keeps memory-mapped float32 points without a copy
+        self.dtype = self.points_array.dtype
+        # (k, d) buffer of the current cluster centers, in the frame of
+        # points_array
+        self.center_array = self.as_points(self.pick_center_points())
         self.clusters_dictionary = self.initiate_cluster()
+        self.labels = np.zeros(len(self.point_set), dtype=np.intp)
+        # the labels are placeholders, or belong to other centers, until
+        # the next full assignment
+        self.stale_labels = True
+        self.membership = None
+        self.iterations = 0
+        self.converged = False
+        # largest center move of the last update, points that changed
+        # cluster in the last assignment and the inertia it reached
+        self.center_shift = np.inf
+        self.reassigned_count = len(self.labels)
+        self.assignment_inertia = None
+        # running per-cluster coordinate sums and point counts matching the
+        # current labels, None until the first assignment
+        self.cluster_sums = None
+        self.cluster_counts = None
+        # triangle inequality bounds, None until the first full assignment
+        self.upper_bounds = None
+        self.lower_bounds = None
+        # point to center distances computed in every assignment step
+        self.distance_counts = []
+        # bumped whenever the centers change, the KD-tree over the centers
+        # used by predict is rebuilt when its version falls behind
+        self.centers_version = 0
+        self.center_tree = None
+        self.tree_version = None
+
+    @property
+    def points_array(self):
+        """The (n, d) coordinate buffer of the points being clustered,
+        shifted by point_set.offset when the points are centered"""
+        return self.point_set.coordinates
+
+    @property
+    def centers(self):
+        """The (k, d) cluster centers in the frame of the input points"""
+        if self.point_set.offset is None:
+            return self.center_array
+        return self.point_set.restore(self.center_array).astype(self.dtype)
+
+    @centers.setter
+    def centers(self, centers):
+        self.center_array = self.as_points(centers).copy()
+        self.centers_moved()
+
+    @property
+    def points_dictionary(self) -> dict:
+        """
+        Dictionary of point vertices as tuples mapped to PointCoord objects,
+        built on request only
+        """
+        return self.points_dict()
 
     def points_dict(self) -> dict:
         """
         Dictionary maps point vertices in the geometric space as tuples to
-        PointCoord(x, y, z) object
+        PointCoord(x, y, z) screen position objects. Sparse points are
+        densified one chunk at a time
         """
-        return {point: PointCoord(*point) for point in self.points}
+        n = len(self.point_set)
+        rows = it.chain.from_iterable(
+            self.point_set.restore(dense_rows(
+                self.points_array,
+                slice(start, start + self.chunk_size))).tolist()
+            for start in range(0, n, self.chunk_size))
+        return {tuple(row): point for row, point in
+                zip(rows, self.point_set)}
 
     @staticmethod
     def iter_point_coord(point) -> PointCoord:
@@ -114,18 +709,31 @@ class KMeans:
 
     def pick_center_points(self) -> list:
         """
-        Return k random points from the points dictionary as the k starting
-        centers of each cluster
+        Return k points picked with the chosen seeding method as the k
+        starting centers of each cluster. An array given as init is used as
+        the starting centers as is, for warm starts from an earlier fit
         """
-        return rnd.sample(list(self.points_dictionary.keys()), k=self.k)
+        if not isinstance(self.init, str):
+            return [tuple(center) for center in np.asarray(self.init)]
+        seeding = self.seeding_methods[self.init]
+        return [tuple(center) for center in self.point_set.restore(
+            seeding(self.points_array, self.k, self.rng))]
 
     def initiate_cluster(self) -> dict:
         """
-        Create a new dictionary of Cluster objects from the picked center
-        points
+        Create a new dictionary of Cluster objects at the screen positions
+        of the picked center points
         """
-        return {key: Cluster(*val) for key, val in
-                enumerate(self.pick_center_points())}
+        return {key: Cluster(*val, point_set=self.point_set) for key, val in
+                enumerate(self.point_set.projection.project(
+                    self.centers).tolist())}
+
+    def sync_cluster_centers(self, clusters_dict: dict):
+        """Move every Cluster object's center to its projected center"""
+        for key, position in enumerate(
+                self.point_set.projection.project(self.centers).tolist()):
+            clusters_dict[key].center = PointCoord(*position)
+        return self
 
     @staticmethod
     def get_minimum_cluster(dist_dict: dict) -> int:
@@ -137,54 +745,628 @@ class KMeans:
         Reset points for all Cluster objects in the given Cluster objects
         dictionary
         """
-        for key, value in clusters_dict.items():
-            del value.points[:]
+        for value in clusters_dict.values():
+            value.reset_points()
+        return self
+
+    @property
+    def distance_evaluations(self) -> int:
+        """Point to center distances computed in the last assignment step"""
+        return self.distance_counts[-1] if self.distance_counts else 0
+
+    @property
+    def inertia(self) -> float:
+        """Sum of the distances of the points to their cluster center"""
+        return labelled_inertia(self.points_array, self.center_array,
+                                self.labels, self.chunk_size, self.metric,
+                                prepared=True)
+
+    def fit(self, max_iterations=300):
+        """Run iterate_cluster to the end and return the fitted KMeans"""
+        self.iterations = 0
+        for _ in self.iterate_cluster(max_iterations):
+            self.iterations += 1
+        return self
+
+    def assign_stale_labels(self):
+        """
+        Run a full assignment against the current centers when the labels
+        do not belong to them, after a warm start or a restore without
+        labels, so the running sums start from the right clusters
+        """
+        if self.stale_labels:
+            self.cluster_sums = None
+            self.upper_bounds = None
+            self.lower_bounds = None
+            self.assign_points()
+        return self
+
+    def add_points(self, pts):
+        """
+        Add points to a fitted KMeans. The new points are assigned to the
+        current centers and folded into the running cluster sums, so only
+        the centers they join move. Returns the indices of the new points
+        """
+        self.assign_stale_labels()
+        indices = self.point_set.append(self.metric.normalize_points(
+            self.as_points(pts)))
+        points = self.points_array[indices]
+        self.metric.extend(points)
+        if self.upper_bounds is None:
+            labels = self.metric.nearest(points, self.center_array,
+                                         rows=indices)
+        else:
+            distances = np.sqrt(squared_distances(points, self.center_array))
+            labels = np.argmin(distances, axis=1)
+        self.labels = np.concatenate((self.labels, labels))
+        if self.upper_bounds is not None:
+            rows = np.arange(len(labels))
+            self.upper_bounds = np.concatenate(
+                (self.upper_bounds, distances[rows, labels]))
+            if self.algorithm == 'hamerly':
+                distances[rows, labels] = np.inf
+                distances = distances.min(axis=1)
+            self.lower_bounds = np.concatenate((self.lower_bounds,
+                                                distances))
+        if self.cluster_sums is not None:
+            sums, counts = grouped_sums(points, labels, self.k)
+            self.cluster_sums += sums
+            self.cluster_counts += counts
+        self.refresh_centers()
+        return indices
+
+    def remove_points(self, indices):
+        """
+        Remove the points at the given indices from a fitted KMeans and take
+        them out of the running cluster sums. Indices of later points shift
+        down to keep the point buffer contiguous
+        """
+        indices = np.unique(indices)
+        self.assign_stale_labels()
+        if self.cluster_sums is not None:
+            sums, counts = grouped_sums(self.points_array[indices],
+                                        self.labels[indices], self.k)
+            self.cluster_sums -= sums
+            self.cluster_counts -= counts
+        keep = self.point_set.remove(indices)
+        self.metric.trim(keep)
+        self.labels = self.labels[keep]
+        if self.upper_bounds is not None:
+            self.upper_bounds = self.upper_bounds[keep]
+            self.lower_bounds = self.lower_bounds[keep]
+        return self.refresh_centers()
+
+    def refresh_centers(self):
+        """
+        Move the centers to the mean of the running sums after points were
+        added or removed. The 'hamerly' and 'elkan' bounds are shifted with
+        the centers, so calling fit again skips the points the moves leave
+        settled, while 'lloyd' reassigns every point
+        """
+        if self.cluster_sums is None:
+            self.update_sums(self.labels)
+        old_centers = self.center_array
+        self.center_array = self.metric.update(
+            self.points_array, self.labels, self.cluster_sums,
+            self.cluster_counts, self.center_array)
+        self.centers_moved()
+        self.shift_bounds(old_centers)
+        self.converged = False
+        self.sync_cluster_centers(self.clusters_dictionary)
+        return self.sync_cluster_points(self.clusters_dictionary)
+
+    def as_points(self, pts):
+        """Return points to predict as an (m, d) array in the frame of
+        points_array, or CSR matrix for sparse input"""
+        if sp.issparse(pts):
+            return sp.csr_matrix(pts, dtype=self.dtype)
+        if self.point_set.offset is None:
+            return np.asarray(pts, dtype=self.dtype).reshape(
+                -1, self.point_set.dimension)
+        return (np.asarray(pts).reshape(-1, self.point_set.dimension) -
+                self.point_set.offset).astype(self.dtype)
+
+    def centers_moved(self):
+        """Record that the centers changed. Code changing kmeans.centers in
+        place calls it so predict does not query a stale KD-tree"""
+        self.centers_version += 1
+        return self
+
+    def get_center_tree(self) -> cKDTree:
+        """Return a KD-tree over the current centers, rebuilt only after
+        the centers moved"""
+        if self.tree_version != self.centers_version:
+            self.center_tree = cKDTree(self.center_array)
+            self.tree_version = self.centers_version
+        return self.center_tree
+
+    def predict(self, pts):
+        """
+        Return the key of the closest cluster center for every point
+        without changing the fitted state. Large batches against many
+        centers in low dimension are answered by a KD-tree over the
+        centers, everything else by the vectorized distance kernel
+        """
+        pts = self.metric.normalize_points(self.as_points(pts))
+        if self.metric.bounded and not sp.issparse(pts) and \
+                self.k >= self.tree_min_clusters and \
+                pts.shape[0] >= self.tree_min_batch and \
+                self.point_set.dimension <= self.tree_max_dimension:
+            return self.get_center_tree().query(pts)[1]
+        return assign_labels(pts, self.center_array, self.chunk_size,
+                             self.metric)
+
+    def transform(self, pts=None):
+        """
+        Return the (m, k) distances of points, the clustered points by
+        default, to all centers, the square root taken for squared metrics
+        so sqeuclidean gives Euclidean distances
+        """
+        pts = self.points_array if pts is None else \
+            self.metric.normalize_points(self.as_points(pts))
+        distances = self.metric.pairwise(pts, self.center_array)
+        return np.sqrt(distances) if self.metric.squared else distances
+
+    def save_checkpoint(self, directory):
+        """Write the current centers and labels to a checkpoint directory"""
+        return save_checkpoint(directory, self.centers, self.labels)
+
+    def load_checkpoint(self, directory):
+        """Restore the centers and labels saved in a checkpoint directory"""
+        return self.set_state(*load_checkpoint(directory))
+
+    def set_state(self, centers, labels=None):
+        """
+        Restore the centers, and optionally the labels, of an earlier fit.
+        The triangle inequality bounds are rebuilt on the next assignment,
+        and without labels the next assignment also rebuilds the cluster
+        sums
+        """
+        self.centers = centers
+        self.sync_cluster_centers(self.clusters_dictionary)
+        self.upper_bounds = None
+        self.lower_bounds = None
+        self.cluster_sums = None
+        self.stale_labels = labels is None
+        if labels is not None:
+            self.labels = np.asarray(labels, dtype=np.intp)
+            self.sync_cluster_points(self.clusters_dictionary)
+        return self
+
+    def assign_points(self):
+        """Label every point with the key of its closest cluster center"""
+        if self.algorithm == 'lloyd' and self.workers > 1:
+            # the chunks return full sums, no running update needed
+            self.parallel_assign()
+            self.distance_counts.append(self.labels.size * self.k)
+            self.stale_labels = False
+            return self
+        previous_labels = self.labels.copy()
+        if self.algorithm == 'lloyd':
+            self.labels = assign_labels(self.points_array,
+                                        self.center_array, self.chunk_size,
+                                        self.metric, prepared=True)
+            count = self.labels.size * self.k
+        elif self.upper_bounds is None:
+            count = self.initiate_bounds()
+        elif self.algorithm == 'hamerly':
+            count = self.hamerly_assign()
+        else:
+            count = self.elkan_assign()
+        self.distance_counts.append(count)
+        self.stale_labels = False
+        return self.update_sums(previous_labels)
+
+    def update_sums(self, previous_labels):
+        """
+        Bring the running cluster sums and counts in line with the new
+        labels, only touching the points that changed cluster
+        """
+        changed = np.flatnonzero(previous_labels != self.labels)
+        self.reassigned_count = len(changed)
+        if self.cluster_sums is not None and 2 * len(changed) < len(
+                self.labels):
+            points = self.points_array[changed]
+            old_sums, old_counts = grouped_sums(
+                points, previous_labels[changed], self.k)
+            new_sums, new_counts = grouped_sums(points, self.labels[changed],
+                                                self.k)
+            self.cluster_sums += new_sums - old_sums
+            self.cluster_counts += new_counts - old_counts
+        elif self.cluster_sums is None or len(changed):
+            self.cluster_sums, self.cluster_counts = grouped_sums(
+                self.points_array, self.labels, self.k)
+        return self
+
+    def parallel_assign(self):
+        """
+        Label the points chunk by chunk on a thread pool. Each chunk also
+        returns its partial sums, which are reduced here so the following
+        update does not need another pass over the points
+        """
+        n = len(self.point_set)
+        size = max(1, min(self.chunk_size, -(-n // self.workers)))
+        chunks = [slice(start, start + size) for start in range(0, n, size)]
+        previous_labels = self.labels
+        self.labels = np.empty(n, dtype=np.intp)
+        sums = np.zeros(self.center_array.shape)
+        counts = np.zeros(self.k, dtype=np.intp)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = pool.map(assign_chunk, it.repeat(self.points_array),
+                               it.repeat(self.center_array), chunks,
+                               it.repeat(self.metric))
+            for chunk, (labels, chunk_sums, chunk_counts) in zip(chunks,
+                                                                 results):
+                self.labels[chunk] = labels
+                sums += chunk_sums
+                counts += chunk_counts
+        self.cluster_sums, self.cluster_counts = sums, counts
+        self.reassigned_count = int(np.count_nonzero(
+            previous_labels != self.labels))
+        return self
+
+    def initiate_bounds(self) -> int:
+        """Assign all points with a full distance computation and set the
+        bounds from it"""
+        distances = np.sqrt(squared_distances(self.points_array,
+                                              self.center_array))
+        self.labels = np.argmin(distances, axis=1)
+        rows = np.arange(len(distances))
+        self.upper_bounds = distances[rows, self.labels]
+        if self.algorithm == 'elkan':
+            self.lower_bounds = distances
+        else:
+            distances[rows, self.labels] = np.inf
+            self.lower_bounds = distances.min(axis=1)
+        return distances.size
+
+    def hamerly_assign(self) -> int:
+        """
+        Reassign only the points whose upper bound exceeds both their lower
+        bound on the second closest center and half the distance from
+        their center to its closest neighbour
+        """
+        _, half_closest = center_separation(self.center_array)
+        bound = np.maximum(half_closest[self.labels], self.lower_bounds)
+        candidates = np.flatnonzero(self.upper_bounds > bound)
+        # tighten the upper bound of the candidates
+        self.upper_bounds[candidates] = row_distances(
+            self.points_array[candidates],
+            self.center_array[self.labels[candidates]])
+        count = len(candidates)
+        candidates = candidates[
+            self.upper_bounds[candidates] > bound[candidates]]
+        if len(candidates):
+            distances = np.sqrt(squared_distances(
+                self.points_array[candidates], self.center_array))
+            count += distances.size
+            labels = np.argmin(distances, axis=1)
+            rows = np.arange(len(candidates))
+            self.labels[candidates] = labels
+            self.upper_bounds[candidates] = distances[rows, labels]
+            distances[rows, labels] = np.inf
+            self.lower_bounds[candidates] = distances.min(axis=1)
+        return count
+
+    def elkan_assign(self) -> int:
+        """
+        Reassign points using one lower bound per point and center, only
+        computing the distances to centers that cannot be ruled out by the
+        bounds or the center to center distances
+        """
+        separation, half_closest = center_separation(self.center_array)
+        active = np.flatnonzero(
+            self.upper_bounds > half_closest[self.labels])
+
+        def candidate_mask(points):
+            upper = self.upper_bounds[points, None]
+            mask = (upper > self.lower_bounds[points]) & (
+                    upper > 0.5 * separation[self.labels[points]])
+            mask[np.arange(len(points)), self.labels[points]] = False
+            return mask
+
+        active = active[candidate_mask(active).any(axis=1)]
+        # tighten the upper bound of the points that might move
+        self.upper_bounds[active] = row_distances(
+            self.points_array[active], self.center_array[self.labels[active]])
+        self.lower_bounds[active, self.labels[active]] = \
+            self.upper_bounds[active]
+        count = len(active)
+        rows, columns = np.nonzero(candidate_mask(active))
+        if len(rows):
+            points = active[rows]
+            distances = row_distances(self.points_array[points],
+                                      self.center_array[columns])
+            count += len(distances)
+            self.lower_bounds[points, columns] = distances
+            # the closest computed center wins, other centers were ruled
+            # out by the bounds
+            closer = distances < self.upper_bounds[points]
+            points, columns = points[closer], columns[closer]
+            distances = distances[closer]
+            order = np.lexsort((distances, points))
+            points, first = np.unique(points[order], return_index=True)
+            self.upper_bounds[points] = distances[order][first]
+            self.labels[points] = columns[order][first]
+        return count
+
+    def shift_bounds(self, old_centers):
+        """Loosen the bounds by how far every center moved"""
+        if self.upper_bounds is None:
+            return self
+        shift = row_distances(self.center_array, old_centers)
+        self.upper_bounds += shift[self.labels]
+        if self.algorithm == 'elkan':
+            self.lower_bounds -= shift
+            np.maximum(self.lower_bounds, 0, out=self.lower_bounds)
+        else:
+            # a point's second closest center can be any center but its own
+            largest = np.argmax(shift)
+            others = np.delete(shift, largest)
+            second = others.max() if len(others) else 0.0
+            self.lower_bounds -= np.where(self.labels == largest, second,
+                                          shift[largest])
         return self
 
     def update_clusters(self, clusters_dict: dict):
-        """Iterate through all Cluster objects and update centers"""
+        """Move all cluster centers to the mean of their assigned points"""
+        old_centers = self.center_array
+        if self.cluster_sums is None:
+            self.update_sums(self.labels)
+        counts = self.cluster_counts
+        self.center_array = self.metric.update(
+            self.points_array, self.labels, self.cluster_sums, counts,
+            self.center_array)
+        if self.empty_cluster != 'keep' and not counts.all():
+            self.repair_empty_clusters(counts)
+        self.centers_moved()
+        self.center_shift = float(
+            row_distances(self.center_array, old_centers).max())
+        self.shift_bounds(old_centers)
+        return self.sync_cluster_centers(clusters_dict)
+
+    def repair_empty_clusters(self, counts):
+        """
+        Move the centers of empty clusters onto points. 'farthest' picks the
+        points farthest from their own center, 'split' picks the farthest
+        member of the currently largest cluster
+        """
+        distances = row_distances(self.points_array,
+                                  self.center_array[self.labels])
+        empty = np.flatnonzero(counts == 0)
+        if self.empty_cluster == 'farthest':
+            count = min(len(empty), len(distances))
+            farthest = np.argpartition(distances, -count)[-count:]
+            self.center_array[empty[:count]] = dense_rows(
+                self.points_array, farthest)
+            return self
+        labels = self.labels.copy()
+        for key in empty:
+            counts = np.bincount(labels, minlength=self.k)
+            largest = np.argmax(counts)
+            if counts[largest] < 2:
+                break
+            members = np.flatnonzero(labels == largest)
+            farthest = members[np.argmax(distances[members])]
+            self.center_array[key] = dense_rows(self.points_array,
+                                                [farthest])[0]
+            # hand the members closer to the new center over to it
+            new_distances = row_distances(self.points_array[members],
+                                          self.center_array[key][None, :])
+            moved = new_distances < distances[members]
+            labels[members[moved]] = key
+            distances[members[moved]] = new_distances[moved]
+        return self
+
+    @property
+    def tracks_inertia(self) -> bool:
+        """Whether inertia_tol or a callback needs the inertia of every
+        assignment"""
+        return self.inertia_tol is not None or any(
+            getattr(callback, 'inertia', False) for callback in
+            self.callbacks)
+
+    def has_converged(self) -> bool:
+        """
+        Check the convergence criteria after an assignment: the last
+        update moved no center more than tol, at most reassign_tol points
+        changed cluster, or the inertia improved by less than inertia_tol
+        relative to the previous assignment
+        """
+        previous_inertia = self.assignment_inertia
+        if self.tracks_inertia:
+            self.assignment_inertia = self.inertia
+        if self.center_shift <= self.tol:
+            return True
+        if self.reassign_tol is not None and \
+                self.reassigned_count <= self.reassign_tol:
+            return True
+        return self.inertia_tol is not None and \
+            previous_inertia is not None and \
+            previous_inertia - self.assignment_inertia <= \
+            self.inertia_tol * previous_inertia
+
+    def report(self, iteration, timer: PhaseTimer):
+        """Send the IterationStats of an iteration to every callback"""
+        if not self.callbacks:
+            return self
+        stats = IterationStats(
+            iteration, timer.seconds, self.assignment_inertia,
+            self.center_shift, self.reassigned_count,
+            self.distance_evaluations, self.converged)
+        for callback in self.callbacks:
+            callback(stats)
+        return self
+
+    def sync_cluster_points(self, clusters_dict: dict):
+        """
+        Point every Cluster object at the indices labelled with its key.
+        The labels are only sorted into clusters once a Cluster's points
+        are read, a fit that never looks at them skips the sort
+        """
+        # hamerly, elkan and mini-batch relabel in place, the membership
+        # keeps the labels of this sync
+        self.membership = ClusterMembership(self.labels.copy(), self.k)
         for key, value in clusters_dict.items():
-            value.update()
+            value.share_membership(self.membership, key)
         return self
 
     def iterate_cluster(self, max_iterations) -> iter:
         """Cluster data according to the closest Cluster center"""
-        old_data = dict()
-        for _ in range(max_iterations):  # max iterations
-            for cord, point in self.points_dictionary.items():
-                # temp dictionary to store distances(value) between current
-                # point and all clusters(keys)
-                dist_dictionary = dict()
-                # assign points to clusters based on minimum distance to
-                # cluster center
-                for key, value in self.clusters_dictionary.items():
-                    # calculate distance between point and current cluster
-                    dist_dictionary[key] = point.distance(value.center)
-                # get the key for the closest cluster center
-                closest_cluster_key = self.get_minimum_cluster(
-                    dist_dictionary)
-                # add PointCoord(x, y, z) object to the closest Cluster object
-                self.clusters_dictionary[closest_cluster_key].add_point(point)
-
-            # get a dictionary of all current centers(values) of clusters(keys)
-            current_data = {key: curr_cluster.center for key, curr_cluster in
-                            self.clusters_dictionary.items()}
+        self.converged = False
+        self.center_shift = np.inf
+        self.assignment_inertia = None
+        for iteration in range(max_iterations):  # max iterations
+            timer = PhaseTimer()
+            # assign points to clusters based on minimum distance to
+            # cluster center
+            self.assign_points()
+            timer.lap('assign')
+            self.sync_cluster_points(self.clusters_dictionary)
+            timer.lap('sync')
             # early iteration exit if converged to a cluster
-            if old_data == current_data:
+            if self.has_converged() and iteration:
+                self.converged = True
+                self.report(iteration, timer.lap('converge'))
                 break
-            # update old centers data
-            old_data = current_data
+            timer.lap('converge')
             # update cluster centers to new values
             self.update_clusters(self.clusters_dictionary)
+            timer.lap('update')
             yield self.clusters_dictionary
+            # the time spent by the consumer is not part of the fit
+            timer.restart()
             # reset Cluster object points
             self.reset_cluster_points(self.clusters_dictionary)
+            self.report(iteration, timer.lap('reset'))
+        else:
+            # out of iterations, label the points against the last centers
+            self.assign_points()
+            self.sync_cluster_points(self.clusters_dictionary)
+
+
+class MiniBatchKMeans(KMeans):
+    """
+    KMeans variant that only looks at a random batch of points per
+    iteration. Every center moves towards the mean of its batch points with
+    a learning rate of one over the number of points it has seen so far.
+    The fit stops once no center moves more than tol, or once the smoothed
+    batch inertia went max_no_improvement batches without improving by the
+    inertia_tol fraction (by anything when inertia_tol is None). A
+    max_no_improvement of None turns the inertia stop off
+    """
+
+    def __init__(self, pts, k: int, batch_size=1024, max_no_improvement=10,
+                 **kwargs):
+        metric = get_metric(kwargs.get('metric', 'sqeuclidean'))
+        if not metric.online:
+            raise ValueError("the {!r} metric has no online center update, "
+                             "use KMeans instead".format(metric.name))
+        self.batch_size = batch_size
+        self.max_no_improvement = max_no_improvement
+        KMeans.__init__(self, pts, k, **kwargs)
+        # number of points each center has absorbed so far
+        self.center_counts = np.zeros(k)
+        self.batch = NO_POINTS
+        # exponentially weighted average of the per point batch inertia,
+        # its best value so far and the batches since it last improved
+        self.inertia_average = None
+        self.best_inertia_average = None
+        self.no_improvement = 0
+
+    def sample_batch(self):
+        """Return the indices of a batch drawn with replacement"""
+        size = min(self.batch_size, len(self.point_set))
+        return self.rng.integers(len(self.point_set), size=size)
+
+    def update_batch_centers(self, batch, labels):
+        """Move every center towards the mean of its points in the batch"""
+        online_update(self.center_array, self.center_counts,
+                      self.points_array[batch], labels)
+        self.center_array[:] = self.metric.project_centers(self.center_array)
+        return self.centers_moved()
+
+    def inertia_stalled(self) -> bool:
+        """
+        Fold the per point inertia of the last batch into its weighted
+        average and return whether the average went max_no_improvement
+        batches without improving by inertia_tol
+        """
+        if self.max_no_improvement is None:
+            return False
+        batch_inertia = self.assignment_inertia / len(self.batch)
+        if self.inertia_average is None:
+            self.inertia_average = batch_inertia
+        else:
+            # about two batches' share of the data sets the smoothing
+            alpha = min(1.0, 2 * len(self.batch) / len(self.point_set))
+            self.inertia_average += alpha * (batch_inertia -
+                                             self.inertia_average)
+        if self.best_inertia_average is None or self.inertia_average < (
+                1 - (self.inertia_tol or 0.0)) * self.best_inertia_average:
+            self.best_inertia_average = self.inertia_average
+            self.no_improvement = 0
+        else:
+            self.no_improvement += 1
+        return self.no_improvement >= self.max_no_improvement
+
+    def iterate_cluster(self, max_iterations) -> iter:
+        """
+        Cluster data one batch at a time. The yielded Cluster objects only
+        hold the points of the current batch, and the labels of the batch
+        points are written as they are assigned, so a recorded fit shows
+        the labels spreading. Points no batch drew yet keep their old label
+        until the final full assignment
+        """
+        self.converged = False
+        # batch labels no longer match the running sums
+        self.cluster_sums = None
+        self.stale_labels = True
+        self.inertia_average = None
+        self.best_inertia_average = None
+        self.no_improvement = 0
+        for iteration in range(max_iterations):
+            timer = PhaseTimer()
+            self.batch = self.sample_batch()
+            labels = self.metric.nearest(self.points_array[self.batch],
+                                         self.center_array, rows=self.batch)
+            self.distance_counts.append(labels.size * self.k)
+            self.labels[self.batch] = labels
+            timer.lap('assign')
+            self.membership = ClusterMembership(labels, self.k)
+            for key, value in self.clusters_dictionary.items():
+                value.indices = self.batch[self.membership[key]]
+            timer.lap('sync')
+            if self.tracks_inertia or self.max_no_improvement is not None:
+                # inertia of the batch, the full inertia would need a pass
+                self.assignment_inertia = float(self.metric.row_cost(
+                    self.points_array[self.batch], self.center_array[labels],
+                    rows=self.batch).sum())
+            self.reassigned_count = None
+            old_centers = self.center_array.copy()
+            self.update_batch_centers(self.batch, labels)
+            self.center_shift = float(
+                row_distances(self.center_array, old_centers).max())
+            self.sync_cluster_centers(self.clusters_dictionary)
+            timer.lap('update')
+            yield self.clusters_dictionary
+            timer.restart()
+            self.reset_cluster_points(self.clusters_dictionary)
+            self.converged = self.center_shift <= self.tol or \
+                self.inertia_stalled()
+            self.report(iteration, timer.lap('reset'))
+            if self.converged:
+                break
+        # label the full dataset against the final centers
+        self.upper_bounds = None
+        self.assign_points()
+        self.sync_cluster_points(self.clusters_dictionary)
 
 
 class SKLearnKMeans(KMeans):
 
     def __init__(self, k: int, centers=None, features=2, samples=100,
-                 std_dev=1.0):
+                 std_dev=1.0, seed=None, **kwargs):
         """Take in points from sklearn as predefined points for clustering"""
 
         self.cluster_centers = centers
@@ -195,48 +1377,36 @@ class SKLearnKMeans(KMeans):
         self.data_points, self.cluster_keys, self.cluster_centers = make_blobs(
             n_samples=self.sample_quantity, n_features=self.data_features,
             centers=self.cluster_centers, cluster_std=self.data_std_dev,
-            return_centers=True
+            return_centers=True, random_state=seed
         )
 
         self.clustered_dict = self.generate_groups(k)
-        pts = list(
-            map(
-                tuple,
-                list(it.chain(*self.clustered_dict.values()))
-            )
-        )
-        KMeans.__init__(self, pts, k)
+        pts = np.concatenate(list(self.clustered_dict.values()))
+        KMeans.__init__(self, pts, k, seed=seed, **kwargs)
 
     def generate_groups(self, k) -> dict:
-        clusters_dictionary = {cluster_key: [] for cluster_key in range(k)}
-        data_information = list(zip(self.data_points, self.cluster_keys))
-
-        def update_dictionary(dictionary, data_info):
-            """Update all entries of the clusters dict and return an updated
-            dictionary"""
-            #
-            for point, cluster in data_info:
-                cords = point.tolist()
-                if self.data_features < 3:
-                    cords.extend([0]*(3 - self.data_features))
-                # take only the first 3 dimensions
-                dictionary[cluster].append(cords[:3])
-
-            return dictionary
-
-        return update_dictionary(clusters_dictionary, data_information)
+        """
+        Return a dictionary mapping every blob key to the (m, d) array of
+        its points, in their generated order. Every feature is kept, the
+        projection places points on screen
+        """
+        order = np.argsort(self.cluster_keys, kind='stable')
+        bounds = np.cumsum(np.bincount(self.cluster_keys, minlength=k))[:-1]
+        return dict(enumerate(np.split(self.data_points[order], bounds)))
 
     def pick_center_points(self) -> list:
         """Return k random points from each cluster data list"""
-        return [rnd.choice(el) for el in
-                list(it.chain(self.clustered_dict.values()))]
+        return [el[self.rng.integers(len(el))] for el in
+                self.clustered_dict.values()]
 
 
 class OptimalSKLearnKMeans(SKLearnKMeans):
 
-    def __init__(self, k, centers=None, features=2, samples=100, std_dev=1.0):
+    def __init__(self, k, centers=None, features=2, samples=100, std_dev=1.0,
+                 seed=None, **kwargs):
         SKLearnKMeans.__init__(self, k, centers=centers, features=features,
-                               samples=samples, std_dev=std_dev)
+                               samples=samples, std_dev=std_dev, seed=seed,
+                               **kwargs)
 
     def pick_center_points(self):
         """Return k centroids from each cluster data list"""
@@ -244,30 +1414,17 @@ class OptimalSKLearnKMeans(SKLearnKMeans):
 
 
 def generate_vertices(n: int, lim: int, three_d=False, seed=100):
-    """Return a list of n '(x, y, z)' tuples"""
-    rnd.seed(seed)
+    """
+    Return a list of n distinct '(x, y, z)' tuples drawn from a triangular
+    distribution, in a stable order for the seed
+    """
     if three_d:
-        verts = list(
-            set(
-                [
-                    (
-                        rnd.triangular(-1.6*lim, 1.6*lim),
-                        rnd.triangular(-lim, lim),
-                        rnd.triangular(-lim, lim)
-                    ) for _ in range(n)
-                ]
-            )
-        )
-    else:
-        verts = list(
-            set(
-                [
-                    (
-                        rnd.triangular(-1.6*lim, 1.6*lim, -3),
-                        rnd.triangular(-lim, lim, 2),
-                        0
-                    ) for _ in range(n)
-                ]
-            )
-        )
-    return verts
\ No newline at end of file
+        return list(map(tuple, generate_points(
+            n, Triangular(low=(-1.6 * lim, -lim, -lim),
+                          high=(1.6 * lim, lim, lim)),
+            dimension=3, seed=seed, unique=True).tolist()))
+    points = generate_points(
+        n, Triangular(low=(-1.6 * lim, -lim), high=(1.6 * lim, lim),
+                      mode=(-3, 2)),
+        dimension=2, seed=seed, unique=True)
+    return [(x, y, 0) for x, y in points.tolist()]
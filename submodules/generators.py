@@ -0,0 +1,179 @@
+import numpy as np
+from submodules.point_store import create_point_store
+
+
+class Triangular:
+    """
+    Independent triangular distribution per coordinate between low and
+    high, peaking at mode (the midpoint by default). The bounds broadcast
+    over the dimension, and a mode outside them is clipped to the nearest
+    bound
+    """
+
+    def __init__(self, low=-4.0, high=4.0, mode=None):
+        self.low = low
+        self.high = high
+        self.mode = mode
+        self.bounds = None
+
+    def fit(self, rng, dimension: int):
+        """Fix the per coordinate parameters for the given dimension"""
+        low = np.broadcast_to(np.asarray(self.low, dtype=float), dimension)
+        high = np.broadcast_to(np.asarray(self.high, dtype=float), dimension)
+        mode = (low + high) / 2 if self.mode is None else np.clip(
+            np.broadcast_to(np.asarray(self.mode, dtype=float), dimension),
+            low, high)
+        self.bounds = low, mode, high
+        return self
+
+    def sample(self, rng, start: int, count: int):
+        """Return count points and no labels"""
+        low, mode, high = self.bounds
+        return rng.triangular(low, mode, high,
+                              size=(count, len(low))), None
+
+
+class Uniform(Triangular):
+    """Independent uniform distribution per coordinate between low and
+    high"""
+
+    def sample(self, rng, start: int, count: int):
+        low, _, high = self.bounds
+        return rng.uniform(low, high, size=(count, len(low))), None
+
+
+class Blobs:
+    """
+    Isotropic Gaussian blobs around centers, given as an (m, d) array or
+    drawn uniformly from center_box when given as a count. Points take the
+    blobs in turn, so every blob gets the same share of any range of rows
+    and the result does not depend on the chunk size
+    """
+
+    def __init__(self, centers=3, std=1.0, center_box=(-10.0, 10.0)):
+        self.centers = centers
+        self.std = std
+        self.center_box = center_box
+        self.blob_centers = None
+        self.blob_std = None
+
+    def fit(self, rng, dimension: int):
+        """Fix the blob centers for the given dimension"""
+        if np.ndim(self.centers) == 0:
+            self.blob_centers = rng.uniform(*self.center_box,
+                                            size=(self.centers, dimension))
+        else:
+            self.blob_centers = np.asarray(self.centers, dtype=float)
+        self.blob_std = np.broadcast_to(
+            np.asarray(self.std, dtype=float), len(self.blob_centers))
+        return self
+
+    def sample(self, rng, start: int, count: int):
+        """Return count points and the blob each one was drawn from"""
+        labels = np.arange(start, start + count) % len(self.blob_centers)
+        noise = rng.standard_normal((count, self.blob_centers.shape[1]))
+        return self.blob_centers[labels] + noise * \
+            self.blob_std[labels, None], labels
+
+
+class Anisotropic(Blobs):
+    """
+    Gaussian blobs stretched by a linear transformation of the whole
+    dataset, a random (d, d) one unless given
+    """
+
+    def __init__(self, centers=3, std=1.0, center_box=(-10.0, 10.0),
+                 transformation=None):
+        Blobs.__init__(self, centers, std, center_box)
+        self.transformation = transformation
+        self.matrix = None
+
+    def fit(self, rng, dimension: int):
+        Blobs.fit(self, rng, dimension)
+        self.matrix = rng.normal(size=(dimension, dimension)) \
+            if self.transformation is None else np.asarray(
+                self.transformation, dtype=float)
+        return self
+
+    def sample(self, rng, start: int, count: int):
+        points, labels = Blobs.sample(self, rng, start, count)
+        return points @ self.matrix, labels
+
+
+distributions = {
+    'triangular': Triangular,
+    'uniform': Uniform,
+    'blobs': Blobs,
+    'anisotropic': Anisotropic,
+}
+
+
+def get_distribution(distribution, **params):
+    """Return a distribution instance from its name or the instance
+    itself"""
+    if isinstance(distribution, str):
+        if distribution not in distributions:
+            raise ValueError(
+                "distribution must be one of {}, got {!r}".format(
+                    tuple(distributions), distribution))
+        return distributions[distribution](**params)
+    return distribution
+
+
+def generate_chunks(n: int, distribution='triangular', dimension=3,
+                    seed=None, chunk_size=1 << 20, **params):
+    """
+    Yield (start, points, labels) chunks of n points drawn from one seeded
+    Generator. The draws are sequential, so the points do not depend on
+    the chunk size
+    """
+    rng = np.random.default_rng(seed)
+    distribution = get_distribution(distribution, **params).fit(rng,
+                                                                dimension)
+    for start in range(0, n, chunk_size):
+        count = min(chunk_size, n - start)
+        points, labels = distribution.sample(rng, start, count)
+        yield start, points, labels
+
+
+def generate_points(n: int, distribution='triangular', dimension=3,
+                    seed=None, unique=False, return_labels=False,
+                    dtype=float, **params):
+    """
+    Return exactly n points as an (n, dimension) array, and their labels
+    (None for unlabelled distributions) when return_labels is set. With
+    unique duplicate rows are redrawn in place, so the order of the
+    remaining points is kept
+    """
+    points = np.empty((n, dimension), dtype=dtype)
+    rng = np.random.default_rng(seed)
+    distribution = get_distribution(distribution, **params).fit(rng,
+                                                                dimension)
+    sampled, labels = distribution.sample(rng, 0, n)
+    points[:] = sampled
+    while unique:
+        _, first = np.unique(points, axis=0, return_index=True)
+        duplicates = np.setdiff1d(np.arange(n), first)
+        if not len(duplicates):
+            break
+        redrawn, redrawn_labels = distribution.sample(rng, 0,
+                                                      len(duplicates))
+        points[duplicates] = redrawn
+        if labels is not None:
+            labels[duplicates] = redrawn_labels
+    return (points, labels) if return_labels else points
+
+
+def write_points(path, n: int, distribution='triangular', dimension=3,
+                 seed=None, chunk_size=1 << 20, dtype=np.float32, **params):
+    """
+    Write n generated points to a .npy point file one chunk at a time, for
+    datasets larger than memory, and return the file path. The file holds
+    the same points generate_points returns for the seed
+    """
+    store = create_point_store(path, n, dimension, dtype=dtype)
+    for start, points, _ in generate_chunks(n, distribution, dimension,
+                                            seed, chunk_size, **params):
+        store[start:start + len(points)] = points
+    store.flush()
+    return path
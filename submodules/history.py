@@ -0,0 +1,160 @@
+import itertools as it
+import numpy as np
+
+
+class FitHistory:
+    """
+    Compact record of a KMeans fit. Every frame holds the centers as a
+    (k, d) float32 array and the point labels in the smallest integer type
+    that fits k. With delta encoding only the first frame keeps all labels,
+    later frames keep the indices and labels of the points that changed.
+
+    A history made by record_fit ends with the state iterate_cluster leaves
+    behind, so replay reproduces the fit without recomputing it.
+    """
+
+    def __init__(self, initial_centers, k: int, delta_encode=True):
+        self.initial_centers = np.asarray(initial_centers, dtype=np.float32)
+        self.k = k
+        self.label_dtype = np.min_scalar_type(max(k - 1, 0))
+        self.delta_encode = delta_encode
+        self.centers = []
+        # label frames when not delta encoded, otherwise the first frame
+        # and the per-frame changes
+        self.label_frames = []
+        self.delta_indices = []
+        self.delta_labels = []
+        self.last_labels = None
+        self.converged = False
+
+    def __len__(self):
+        return len(self.centers)
+
+    def record(self, centers, labels):
+        """Add a frame of centers and labels"""
+        labels = np.asarray(labels).astype(self.label_dtype)
+        self.centers.append(np.asarray(centers, dtype=np.float32))
+        if not self.delta_encode or self.last_labels is None:
+            self.label_frames.append(labels)
+        else:
+            changed = np.flatnonzero(labels != self.last_labels).astype(
+                np.int32)
+            self.delta_indices.append(changed)
+            self.delta_labels.append(labels[changed])
+        self.last_labels = labels
+        return self
+
+    @classmethod
+    def record_fit(cls, kmeans, max_iterations=300, delta_encode=True):
+        """
+        Run kmeans.iterate_cluster to the end and return the history of
+        every yielded state plus the final one
+        """
+        history = cls(kmeans.centers, kmeans.k, delta_encode)
+        for _ in kmeans.iterate_cluster(max_iterations):
+            history.record(kmeans.centers, kmeans.labels)
+        history.record(kmeans.centers, kmeans.labels)
+        history.converged = kmeans.converged
+        return history
+
+    def frames(self) -> iter:
+        """Yield the (centers, labels) of every frame in order"""
+        labels = None
+        for index, centers in enumerate(self.centers):
+            if not self.delta_encode:
+                labels = self.label_frames[index]
+            elif index == 0:
+                labels = self.label_frames[0].copy()
+            else:
+                labels[self.delta_indices[index - 1]] = \
+                    self.delta_labels[index - 1]
+            yield centers, labels
+
+    def restore_initial(self, kmeans):
+        """Move the centers of kmeans to where the recorded fit started"""
+        return kmeans.set_state(self.initial_centers)
+
+    @property
+    def iterations(self) -> int:
+        """Number of iterations replay yields, the last frame is the final
+        state"""
+        return max(len(self) - 1, 0)
+
+    def centers_before(self, iteration: int):
+        """Return the centers at the start of an iteration"""
+        return self.initial_centers if iteration == 0 else \
+            self.centers[iteration - 1]
+
+    def replay(self, kmeans, first=0, stop=None) -> iter:
+        """
+        Drive kmeans through the recorded fit like iterate_cluster does:
+        yield its clusters_dictionary for every iteration and leave it in
+        the final recorded state. first and stop limit the replay to the
+        iterations in [first, stop), the final state is only restored when
+        the replay runs to the end
+        """
+        stop = self.iterations if stop is None else min(stop,
+                                                        self.iterations)
+        for index, (centers, labels) in enumerate(self.frames()):
+            if index < first:
+                continue
+            if index == stop:
+                if stop == self.iterations:
+                    kmeans.set_state(centers, labels)
+                    kmeans.converged = self.converged
+                return
+            kmeans.set_state(centers, labels)
+            yield kmeans.clusters_dictionary
+            kmeans.reset_cluster_points(kmeans.clusters_dictionary)
+
+    def save(self, path):
+        """Write the history to a compressed .npz file"""
+        arrays = {
+            'initial_centers': self.initial_centers,
+            'centers': np.array(self.centers, dtype=np.float32).reshape(
+                len(self), *self.initial_centers.shape),
+            'k': np.array(self.k),
+            'converged': np.array(self.converged),
+            'delta_encode': np.array(self.delta_encode),
+            'labels': np.array(self.label_frames, dtype=self.label_dtype),
+        }
+        if self.delta_encode:
+            arrays['delta_indices'] = np.concatenate(
+                self.delta_indices or [np.empty(0, dtype=np.int32)])
+            arrays['delta_labels'] = np.concatenate(
+                self.delta_labels or [np.empty(0, dtype=self.label_dtype)])
+            arrays['delta_offsets'] = np.cumsum(
+                [0] + [len(changed) for changed in self.delta_indices])
+        np.savez_compressed(path, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Read a history written by save"""
+        with np.load(path) as arrays:
+            history = cls(arrays['initial_centers'], int(arrays['k']),
+                          bool(arrays['delta_encode']))
+            history.converged = bool(arrays['converged'])
+            history.centers = list(arrays['centers'])
+            history.label_frames = list(arrays['labels'])
+            if history.delta_encode:
+                offsets = arrays['delta_offsets']
+                indices = arrays['delta_indices']
+                labels = arrays['delta_labels']
+                history.delta_indices = [
+                    indices[start:stop] for start, stop in
+                    zip(offsets[:-1], offsets[1:])]
+                history.delta_labels = [
+                    labels[start:stop] for start, stop in
+                    zip(offsets[:-1], offsets[1:])]
+        for _, labels in history.frames():
+            # later records are encoded against the last loaded frame
+            history.last_labels = labels.copy()
+        return history
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the recorded arrays"""
+        return sum(array.nbytes for array in it.chain(
+            [self.initial_centers], self.centers, self.label_frames,
+            self.delta_indices, self.delta_labels))
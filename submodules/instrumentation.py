@@ -0,0 +1,69 @@
+import time
+from collections import namedtuple
+
+
+IterationStats = namedtuple('IterationStats', [
+    'iteration',             # index of the iteration within the fit
+    'phase_seconds',         # wall time per phase, e.g. assign and update
+    'inertia',               # sum of distances after assignment, or None
+    'center_shift',          # largest center move of the iteration's update
+    'reassigned',            # points that changed cluster in the assignment
+    'distance_evaluations',  # point to center distances computed
+    'converged',             # whether the fit stopped at this iteration
+])
+
+
+class PhaseTimer:
+    """Wall clock that accumulates the time between laps per phase name"""
+
+    __slots__ = ('seconds', 'last')
+
+    def __init__(self):
+        self.seconds = {}
+        self.last = time.perf_counter()
+
+    def restart(self):
+        """Start timing from now, dropping the time since the last lap"""
+        self.last = time.perf_counter()
+        return self
+
+    def lap(self, phase):
+        """Add the time since the previous lap to the phase"""
+        now = time.perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + now - self.last
+        self.last = now
+        return self
+
+
+class IterationLog:
+    """
+    KMeans callback keeping every IterationStats it receives. Pass an
+    instance in the callbacks list and read stats or rows after the fit.
+    With inertia set the fit also computes the inertia of every
+    assignment, at the cost of an extra pass over the points
+    """
+
+    def __init__(self, inertia=False):
+        self.inertia = inertia
+        self.stats = []
+
+    def __call__(self, stats: IterationStats):
+        self.stats.append(stats)
+
+    def __len__(self):
+        return len(self.stats)
+
+    def total_seconds(self, phase) -> float:
+        """Return the time spent in a phase over all iterations"""
+        return sum(stats.phase_seconds.get(phase, 0.0) for stats in
+                   self.stats)
+
+    def rows(self) -> list:
+        """Return the stats as flat dictionaries, one per iteration"""
+        rows = []
+        for stats in self.stats:
+            row = stats._asdict()
+            for phase, seconds in row.pop('phase_seconds').items():
+                row[phase + '_seconds'] = seconds
+            rows.append(row)
+        return rows
@@ -0,0 +1,333 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+def row_norms(points):
+    """Return the squared norm of every row of a dense or sparse array"""
+    if sp.issparse(points):
+        return np.asarray(points.multiply(points).sum(axis=1)).ravel()
+    return np.einsum('ij,ij->i', points, points)
+
+
+def row_dots(points, centers):
+    """Return the dot product of every row of points with the same row of
+    the dense centers array"""
+    if sp.issparse(points):
+        return np.asarray(points.multiply(centers).sum(axis=1)).ravel()
+    return np.einsum('ij,ij->i', points, centers)
+
+
+def dot_centers(points, centers):
+    """Return the (n, k) dot products of dense or sparse points with dense
+    centers"""
+    return np.asarray(points @ centers.T)
+
+
+def squared_distances(points, centers):
+    """
+    Return an (n, k) array of squared Euclidean distances between n points
+    and k centers using the ||x||^2 - 2x.c + ||c||^2 expansion. Sparse
+    points only enter through their row norms and a sparse-dense product
+    """
+    distances = row_norms(points)[:, None] \
+        - 2 * dot_centers(points, centers) \
+        + row_norms(centers)[None, :]
+    # rounding can push distances of coincident points slightly below zero
+    return np.maximum(distances, 0, out=distances)
+
+
+def dense_rows(points, indices):
+    """Return the rows of a dense or sparse array at the given indices as a
+    dense array"""
+    rows = points[indices]
+    return rows.toarray() if sp.issparse(rows) else rows
+
+
+def append_rows(cache, buffer, rows):
+    """
+    Return cache with rows appended and the buffer it is a view of. The
+    buffer doubles when full, so repeated appends cost amortized
+    O(len(rows)) instead of a copy of the whole cache
+    """
+    start = len(cache)
+    stop = start + len(rows)
+    if buffer is None or len(buffer) < stop:
+        buffer = np.empty((max(stop, 2 * start),) + cache.shape[1:],
+                          dtype=np.result_type(cache, rows))
+        buffer[:start] = cache
+    buffer[start:stop] = rows
+    return buffer[:stop], buffer
+
+
+def mean_from_sums(sums, counts, centers):
+    """
+    Return the cluster means for the given sums and counts. Centers
+    without any assigned points keep their current position
+    """
+    non_empty = counts > 0
+    new_centers = centers.copy()
+    new_centers[non_empty] = sums[non_empty] / counts[non_empty, None]
+    return new_centers
+
+
+class SquaredEuclidean:
+    """
+    Squared Euclidean distance, the k-means objective. The squared norms of
+    the dataset's points are cached by prepare, and the nearest center
+    search drops the point norm altogether since it does not change the
+    argmin
+    """
+
+    name = 'sqeuclidean'
+    # distances are Euclidean, so the Hamerly and Elkan bounds hold
+    bounded = True
+    # distances are squares, KMeans.transform takes their square root
+    squared = True
+    # works on scipy.sparse points without densifying them
+    sparse = True
+    # centers are the means of their points, so mini-batches can move them
+    # with online mean updates
+    online = True
+    # distances only depend on differences of points, so points and
+    # centers can be stored shifted by a common offset
+    shift_invariant = True
+
+    def __init__(self):
+        self.point_norms = None
+        # storage point_norms is a view of while points are appended
+        self.norm_buffer = None
+
+    def normalize_points(self, points):
+        """Return input points in the form the metric works on"""
+        return points
+
+    def prepare(self, points):
+        """Cache the per point data of the dataset being clustered"""
+        self.point_norms = row_norms(points)
+        self.norm_buffer = None
+        return self
+
+    def extend(self, points):
+        """Cache the per point data of points appended to the prepared
+        dataset"""
+        if self.point_norms is not None:
+            self.point_norms, self.norm_buffer = append_rows(
+                self.point_norms, self.norm_buffer, row_norms(points))
+        return self
+
+    def trim(self, keep):
+        """Drop the cached data of removed points, keep is the boolean mask
+        of the kept points"""
+        if self.point_norms is not None:
+            self.point_norms = self.point_norms[keep]
+            self.norm_buffer = None
+        return self
+
+    def norms(self, points, rows=None):
+        """Squared norms of points, taken from the cache when rows into the
+        prepared dataset are given"""
+        if rows is not None and self.point_norms is not None:
+            return self.point_norms[rows]
+        return row_norms(points)
+
+    def pairwise(self, points, centers, rows=None):
+        """Return the (m, k) distances of points to centers"""
+        distances = self.norms(points, rows)[:, None] \
+            - 2 * dot_centers(points, centers) \
+            + row_norms(centers)[None, :]
+        return np.maximum(distances, 0, out=distances)
+
+    def nearest(self, points, centers, rows=None):
+        """Return the index of the closest center for every point"""
+        return np.argmin(row_norms(centers)[None, :]
+                         - 2 * dot_centers(points, centers), axis=1)
+
+    def row_cost(self, points, centers, rows=None):
+        """Return the distance of every point to its paired center"""
+        if sp.issparse(points):
+            cost = self.norms(points, rows) - 2 * row_dots(points, centers) \
+                + row_norms(centers)
+            return np.maximum(cost, 0, out=cost)
+        difference = points - centers
+        return np.einsum('ij,ij->i', difference, difference)
+
+    def update(self, points, labels, sums, counts, centers):
+        """Return the new centers from the grouped sums of the points"""
+        return self.project_centers(mean_from_sums(sums, counts, centers))
+
+    def project_centers(self, centers):
+        """Bring centers back into the metric's domain"""
+        return centers
+
+
+class Cosine(SquaredEuclidean):
+    """
+    Cosine distance for spherical k-means. Points are normalized to unit
+    length once, and centers are renormalized after every update, so the
+    closest center is the one with the largest dot product. Zero rows stay
+    zero and are equally far from every center, which breaks the Euclidean
+    bounds, so only 'lloyd' runs with this metric
+    """
+
+    name = 'cosine'
+    bounded = False
+    squared = False
+    # angles change when the points are shifted
+    shift_invariant = False
+
+    def normalize_points(self, points):
+        if sp.issparse(points):
+            norms = np.sqrt(row_norms(points))
+            return sp.diags(1 / np.where(norms > 0, norms, 1)) @ points
+        norms = np.linalg.norm(points, axis=1, keepdims=True)
+        return points / np.where(norms > 0, norms, 1)
+
+    def pairwise(self, points, centers, rows=None):
+        return 1 - dot_centers(points, centers)
+
+    def nearest(self, points, centers, rows=None):
+        return np.argmax(dot_centers(points, centers), axis=1)
+
+    def row_cost(self, points, centers, rows=None):
+        return 1 - row_dots(points, centers)
+
+    def project_centers(self, centers):
+        norms = np.linalg.norm(centers, axis=1, keepdims=True)
+        return centers / np.where(norms > 0, norms, 1)
+
+
+class Manhattan(SquaredEuclidean):
+    """
+    Manhattan (L1) distance with the k-medians update: every center moves
+    to the per coordinate median of its points
+    """
+
+    name = 'manhattan'
+    bounded = False
+    squared = False
+    sparse = False
+    online = False
+
+    def prepare(self, points):
+        return self
+
+    def pairwise(self, points, centers, rows=None):
+        # one center at a time keeps memory at O(m) instead of O(m * k * d)
+        distances = np.empty((len(points), len(centers)))
+        for key, center in enumerate(centers):
+            distances[:, key] = np.abs(points - center).sum(axis=1)
+        return distances
+
+    def nearest(self, points, centers, rows=None):
+        return np.argmin(self.pairwise(points, centers), axis=1)
+
+    def row_cost(self, points, centers, rows=None):
+        return np.abs(points - centers).sum(axis=1)
+
+    def update(self, points, labels, sums, counts, centers):
+        new_centers = centers.copy()
+        order = np.argsort(labels, kind='stable')
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        for key in np.flatnonzero(counts):
+            members = order[bounds[key]:bounds[key + 1]]
+            new_centers[key] = np.median(points[members], axis=0)
+        return new_centers
+
+
+class Mahalanobis(SquaredEuclidean):
+    """
+    Squared Mahalanobis distance under the given covariance, estimated
+    from (a sample of) the points when not given. Distances are squared
+    Euclidean distances after whitening, and the whitened points are
+    cached by prepare
+    """
+
+    name = 'mahalanobis'
+    bounded = False
+    # the covariance is dense (d, d)
+    sparse = False
+
+    def __init__(self, covariance=None, sample_size=100000, seed=0):
+        SquaredEuclidean.__init__(self)
+        self.covariance = covariance
+        self.sample_size = sample_size
+        self.seed = seed
+        self.whitening = None
+        self.whitened = None
+        self.whitened_buffer = None
+
+    def prepare(self, points):
+        if self.whitening is None:
+            covariance = self.covariance
+            if covariance is None:
+                sample = points
+                if len(points) > self.sample_size:
+                    rng = np.random.default_rng(self.seed)
+                    sample = points[rng.choice(len(points), self.sample_size,
+                                               replace=False)]
+                covariance = np.atleast_2d(np.cov(sample, rowvar=False))
+            # L with L @ L.T equal to the inverse covariance
+            self.whitening = np.linalg.cholesky(np.linalg.inv(covariance))
+        self.whitened = points @ self.whitening
+        self.whitened_buffer = None
+        self.point_norms = np.einsum('ij,ij->i', self.whitened,
+                                     self.whitened)
+        self.norm_buffer = None
+        return self
+
+    def extend(self, points):
+        if self.whitened is not None:
+            whitened = points @ self.whitening
+            self.whitened, self.whitened_buffer = append_rows(
+                self.whitened, self.whitened_buffer, whitened)
+            self.point_norms, self.norm_buffer = append_rows(
+                self.point_norms, self.norm_buffer,
+                np.einsum('ij,ij->i', whitened, whitened))
+        return self
+
+    def trim(self, keep):
+        SquaredEuclidean.trim(self, keep)
+        if self.whitened is not None:
+            self.whitened = self.whitened[keep]
+            self.whitened_buffer = None
+        return self
+
+    def whiten(self, points, rows=None):
+        """Return whitened points, taken from the cache when rows into the
+        prepared dataset are given"""
+        if rows is not None and self.whitened is not None:
+            return self.whitened[rows]
+        return points @ self.whitening
+
+    def pairwise(self, points, centers, rows=None):
+        return SquaredEuclidean.pairwise(
+            self, self.whiten(points, rows), centers @ self.whitening, rows)
+
+    def nearest(self, points, centers, rows=None):
+        return SquaredEuclidean.nearest(
+            self, self.whiten(points, rows), centers @ self.whitening)
+
+    def row_cost(self, points, centers, rows=None):
+        return SquaredEuclidean.row_cost(
+            self, self.whiten(points, rows), centers @ self.whitening)
+
+
+metrics = {
+    'sqeuclidean': SquaredEuclidean,
+    'euclidean': SquaredEuclidean,
+    'cosine': Cosine,
+    'manhattan': Manhattan,
+    'mahalanobis': Mahalanobis,
+}
+
+
+def get_metric(metric):
+    """Return a metric instance from its name or the instance itself"""
+    if metric is None:
+        return SquaredEuclidean()
+    if isinstance(metric, str):
+        if metric not in metrics:
+            raise ValueError("metric must be one of {}, got {!r}".format(
+                tuple(metrics), metric))
+        return metrics[metric]()
+    return metric
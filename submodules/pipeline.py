@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import numpy as np
+import scipy.sparse as sp
+from submodules.cluster import KMeans
+from submodules.history import FitHistory
+
+
+# directory of the fit cache, KMEANS_CACHE overrides it
+CACHE_DIRECTORY = os.environ.get('KMEANS_CACHE', '.fit_cache')
+CACHE_MAX_BYTES = 256 << 20
+
+
+def fit_key(points, k: int, seed=None, **params) -> str:
+    """
+    Return the cache key of a fit: a hash of the point data and of every
+    option that changes the fitted trace
+    """
+    digest = hashlib.sha256()
+    if sp.issparse(points):
+        points = sp.csr_matrix(points)
+        arrays = (points.data, points.indices, points.indptr)
+    else:
+        arrays = (np.asarray(points, dtype=float),)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update('{}{}'.format(array.dtype, array.shape).encode())
+        digest.update(array.data)
+    digest.update(json.dumps(dict(params, k=k, seed=seed), sort_keys=True,
+                             default=repr).encode())
+    return digest.hexdigest()[:32]
+
+
+class FitCache:
+    """
+    Directory of FitHistory .npz files named by fit key. Reading a history
+    marks it as recently used, and writing one evicts the least recently
+    used histories until the directory fits in max_bytes
+    """
+
+    def __init__(self, directory=CACHE_DIRECTORY, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key) -> str:
+        """Return the file path of a key"""
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """Return the cached FitHistory of the key or None"""
+        path = self.path(key)
+        try:
+            history = FitHistory.load(path)
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return history
+
+    def put(self, key, history: FitHistory) -> str:
+        """Store a FitHistory under the key and return its path"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        # write aside and rename, so concurrent renders never read a
+        # partial file
+        partial = history.save(os.path.join(
+            self.directory, '{}.{}.partial.npz'.format(key, os.getpid())))
+        os.replace(partial, path)
+        self.evict(keep=path)
+        return path
+
+    def entries(self) -> list:
+        """Return (last use, size, path) of every cached history, least
+        recently used first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.npz') and not name.endswith('.partial.npz'):
+                status = os.stat(path)
+                entries.append((status.st_mtime, status.st_size, path))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        """Remove least recently used histories, except keep, until the
+        cache fits in max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
+        return self
+
+
+def cached_fit(points, k: int, seed=None, max_iterations=300, cache=None,
+               **params) -> tuple:
+    """
+    Return a KMeans over the points, set to the start of its fit, and the
+    FitHistory of the fit. The history is read from the cache when the
+    same points, k, seed and options were fitted before, otherwise it is
+    recorded once and stored. Either way the KMeans starts from the
+    recorded initial centers, so replaying the history drives every scene
+    through the same trace
+    """
+    cache = FitCache() if cache is None else cache
+    key = fit_key(points, k, seed, max_iterations=max_iterations, **params)
+    history = cache.get(key)
+    if history is None:
+        history = FitHistory.record_fit(KMeans(points, k, seed=seed,
+                                               **params), max_iterations)
+        cache.put(key, history)
+    kmeans = KMeans(points, k, seed=seed,
+                    **dict(params, init=history.initial_centers))
+    return kmeans, history
@@ -0,0 +1,76 @@
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+# file names of a checkpoint directory
+CENTERS_FILE = 'centers.npy'
+LABELS_FILE = 'labels.npy'
+
+
+def create_point_store(path, count: int, dimension: int, dtype=np.float32):
+    """
+    Create an empty (count, dimension) point file and return it as a
+    writable memory map. The .npy header records the dtype and shape
+    """
+    return open_memmap(path, mode='w+', dtype=dtype, shape=(count, dimension))
+
+
+def save_points(path, points, dtype=np.float32):
+    """Write points to a .npy point file and return the file path"""
+    points = np.asarray(points)
+    store = create_point_store(path, len(points),
+                               points.reshape(len(points), -1).shape[1],
+                               dtype=dtype)
+    store[:] = points.reshape(store.shape)
+    store.flush()
+    return path
+
+
+def open_points(path, mode='r'):
+    """
+    Open a .npy point file as a memory map. KMeans uses floating point
+    maps without copying them, so worker processes opening the same file
+    share its pages
+    """
+    points = np.load(path, mmap_mode=mode)
+    if points.ndim != 2:
+        raise ValueError("point file {} holds a {}-dimensional array, "
+                         "expected (count, dimension)".format(path,
+                                                              points.ndim))
+    return points
+
+
+def point_chunks(path, chunk_size=65536):
+    """Yield consecutive chunks of a point file without loading it"""
+    points = open_points(path)
+    for start in range(0, len(points), chunk_size):
+        yield points[start:start + chunk_size]
+
+
+def save_checkpoint(directory, centers, labels=None):
+    """
+    Write centers, and optionally labels, of a fit to a checkpoint
+    directory as memory mapped .npy files
+    """
+    os.makedirs(directory, exist_ok=True)
+    save_points(os.path.join(directory, CENTERS_FILE), centers,
+                dtype=np.float64)
+    if labels is not None:
+        stored = open_memmap(os.path.join(directory, LABELS_FILE),
+                             mode='w+', dtype=np.int32, shape=(len(labels),))
+        stored[:] = labels
+        stored.flush()
+    return directory
+
+
+def load_checkpoint(directory, mode='r'):
+    """
+    Return the centers and labels (None when not saved) of a checkpoint
+    directory, both memory mapped
+    """
+    centers = np.load(os.path.join(directory, CENTERS_FILE), mmap_mode=mode)
+    labels_path = os.path.join(directory, LABELS_FILE)
+    labels = np.load(labels_path, mmap_mode=mode) if os.path.exists(
+        labels_path) else None
+    return centers, labels
@@ -0,0 +1,103 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import LinearOperator, svds
+
+
+class FirstCoordinates:
+    """
+    Screen projection keeping the first three coordinates of a point.
+    Points with fewer than three coordinates are padded with zeros
+    """
+
+    def fit(self, points):
+        return self
+
+    def project(self, points):
+        """Return the (m, 3) screen positions of an (m, d) array"""
+        if sp.issparse(points):
+            points = points[:, :3].toarray()
+        points = np.atleast_2d(points)
+        dimension = min(3, points.shape[1])
+        positions = np.zeros((len(points), 3))
+        positions[:, :dimension] = points[:, :dimension]
+        return positions
+
+
+class PCAProjection:
+    """
+    Screen projection onto the three principal components of the points,
+    estimated from a random sample of at most sample_size points. Sparse
+    samples are never densified, the centering is folded into the
+    operator given to a truncated SVD
+    """
+
+    def __init__(self, sample_size=10000, seed=0):
+        self.sample_size = sample_size
+        self.seed = seed
+        self.mean = None
+        self.components = None
+
+    def fit(self, points):
+        rng = np.random.default_rng(self.seed)
+        n = points.shape[0]
+        if n > self.sample_size:
+            points = points[np.sort(rng.choice(n, self.sample_size,
+                                               replace=False))]
+        if sp.issparse(points):
+            return self.fit_sparse(sp.csr_matrix(points, dtype=float))
+        points = np.asarray(points, dtype=float)
+        self.mean = points.mean(axis=0)
+        _, _, components = np.linalg.svd(points - self.mean,
+                                          full_matrices=False)
+        self.components = components[:3]
+        return self
+
+    def fit_sparse(self, points):
+        """Fit the components of a CSR sample"""
+        self.mean = np.asarray(points.mean(axis=0)).ravel()
+
+        # products with X - 1 mean^T without building the dense difference
+        def matvec(vector):
+            vector = np.ravel(vector)
+            return points @ vector - self.mean @ vector
+
+        def rmatvec(vector):
+            vector = np.ravel(vector)
+            return points.T @ vector - self.mean * vector.sum()
+
+        centered = LinearOperator(points.shape, matvec=matvec,
+                                  rmatvec=rmatvec, dtype=float)
+        _, values, components = svds(centered,
+                                     k=min(3, min(points.shape) - 1))
+        self.components = components[np.argsort(values)[::-1]]
+        return self
+
+    def project(self, points):
+        """Return the (m, 3) screen positions of an (m, d) array"""
+        if sp.issparse(points):
+            projected = np.asarray(points @ self.components.T) - \
+                self.mean @ self.components.T
+        else:
+            projected = (np.atleast_2d(points) - self.mean) @ \
+                self.components.T
+        positions = np.zeros((len(projected), 3))
+        positions[:, :projected.shape[1]] = projected
+        return positions
+
+
+projections = {
+    'first': FirstCoordinates,
+    'pca': PCAProjection,
+}
+
+
+def get_projection(projection):
+    """Return a projection instance from its name or the instance itself"""
+    if projection is None:
+        return FirstCoordinates()
+    if isinstance(projection, str):
+        if projection not in projections:
+            raise ValueError("projection must be one of {}, got {!r}".format(
+                tuple(projections), projection))
+        return projections[projection]()
+    return projection
@@ -0,0 +1,103 @@
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import scipy.sparse as sp
+from submodules.cluster import KMeans, PointSet
+from submodules.metrics import get_metric
+from submodules.point_store import open_points
+
+
+RestartResult = namedtuple(
+    'RestartResult', ['seed', 'inertia', 'iterations', 'seconds', 'centers',
+                      'converged', 'center_shift'])
+
+# points attached by every worker process of the pool
+_worker_points = None
+_worker_memory = None
+
+
+def _attach_points(memory_name, shape, dtype, path):
+    """Pool initializer: map the shared points into the worker process"""
+    global _worker_points, _worker_memory
+    if path is not None:
+        _worker_points = open_points(path)
+    else:
+        _worker_memory = shared_memory.SharedMemory(name=memory_name)
+        _worker_points = np.ndarray(shape, dtype=dtype,
+                                    buffer=_worker_memory.buf)
+
+
+def _run_restart(k, seed, max_iterations, kwargs) -> RestartResult:
+    """Fit one KMeans restart on the worker's shared points"""
+    start = time.perf_counter()
+    kmeans = KMeans(_worker_points, k, seed=seed, **kwargs)
+    kmeans.fit(max_iterations)
+    return RestartResult(seed, kmeans.inertia, kmeans.iterations,
+                         time.perf_counter() - start, kmeans.centers,
+                         kmeans.converged, kmeans.center_shift)
+
+
+def run_restarts(points, k: int, n_init=8, max_iterations=300, workers=None,
+                 seed=None, **kwargs):
+    """
+    Fit n_init independently seeded KMeans restarts on a process pool and
+    return the KMeans with the lowest inertia together with the
+    RestartResult of every run.
+
+    points is either a dense array, copied once into shared memory, or the
+    path of a .npy point file that every worker memory maps. Points that
+    KMeans would center, float32 points by default, are centered once and
+    the centered copy is shared instead.
+    """
+    if sp.issparse(points):
+        raise ValueError("run_restarts shares dense points between "
+                         "processes, fit sparse points with KMeans")
+    path = points if isinstance(points, (str, os.PathLike)) else None
+    points = open_points(path) if path is not None else np.asarray(points)
+    center = kwargs.get('center_points')
+    if not get_metric(kwargs.get('metric')).shift_invariant:
+        center = False
+    point_set = PointSet(points, dtype=kwargs.get('dtype'), center=center)
+    shared = point_set.coordinates
+    worker_kwargs = kwargs
+    if point_set.offset is not None:
+        # the workers cluster the centered copy as it is
+        path = None
+        worker_kwargs = dict(kwargs, center_points=False)
+    seeds = np.random.SeedSequence(seed).spawn(n_init)
+    memory = None
+    try:
+        if path is None:
+            memory = shared_memory.SharedMemory(create=True,
+                                                size=max(shared.nbytes, 1))
+            np.ndarray(shared.shape, dtype=shared.dtype,
+                       buffer=memory.buf)[:] = shared
+        with ProcessPoolExecutor(
+                max_workers=workers or min(n_init, os.cpu_count()),
+                initializer=_attach_points,
+                initargs=(memory and memory.name, shared.shape, shared.dtype,
+                          path)) as pool:
+            results = list(pool.map(
+                _run_restart, [k] * n_init, seeds,
+                [max_iterations] * n_init, [worker_kwargs] * n_init))
+    finally:
+        if memory is not None:
+            memory.close()
+            memory.unlink()
+    if point_set.offset is not None:
+        results = [result._replace(centers=point_set.restore(
+            result.centers).astype(result.centers.dtype))
+            for result in results]
+    best = min(results, key=lambda result: result.inertia)
+    # start from the best centers instead of seeding again
+    kmeans = KMeans(points, k, seed=best.seed,
+                    **dict(kwargs, init=best.centers))
+    kmeans.assign_points()
+    kmeans.sync_cluster_points(kmeans.clusters_dictionary)
+    kmeans.iterations = best.iterations
+    kmeans.converged = best.converged
+    kmeans.center_shift = best.center_shift
+    return kmeans, results
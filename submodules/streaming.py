@@ -0,0 +1,81 @@
+import numpy as np
+from submodules.cluster import KMeans, assign_labels, online_update
+
+
+class StreamingKMeans:
+    """
+    Online k-means fed from an iterator of point chunks. Only the current
+    chunk and the (k, d) centers are held in memory, so the input can be
+    larger than memory or never end
+    """
+
+    def __init__(self, k: int, init='k-means++', seed=None, init_size=None):
+        if init not in KMeans.seeding_methods:
+            raise ValueError("init must be one of {}, got {!r}".format(
+                tuple(KMeans.seeding_methods), init))
+        self.k = k
+        self.init = init
+        self.rng = np.random.default_rng(seed)
+        # points buffered from the first chunks to seed the centers from
+        self.init_size = init_size or 10 * k
+        self.seed_buffer = []
+        self.centers = None
+        self.center_counts = np.zeros(k)
+        self.points_seen = 0
+
+    @staticmethod
+    def as_chunk(chunk):
+        """Return a chunk of points as an (m, d) float array"""
+        chunk = np.asarray(chunk, dtype=float)
+        return chunk.reshape(len(chunk), -1)
+
+    def seed_centers(self):
+        """Seed the centers from the buffered points and return them"""
+        buffered = np.concatenate(self.seed_buffer)
+        self.seed_buffer = []
+        seeding = KMeans.seeding_methods[self.init]
+        self.centers = seeding(buffered, self.k, self.rng).astype(float)
+        return buffered
+
+    def partial_fit(self, chunk):
+        """Update the centers with one chunk of points"""
+        chunk = self.as_chunk(chunk)
+        self.points_seen += len(chunk)
+        if self.centers is None:
+            self.seed_buffer.append(chunk)
+            if sum(map(len, self.seed_buffer)) < max(self.init_size, self.k):
+                return self
+            chunk = self.seed_centers()
+        online_update(self.centers, self.center_counts, chunk,
+                      assign_labels(chunk, self.centers))
+        return self
+
+    def fit(self, chunks):
+        """Update the centers with every chunk of the iterator"""
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        if self.centers is None and self.seed_buffer:
+            # the whole stream was shorter than init_size
+            buffered = self.seed_centers()
+            online_update(self.centers, self.center_counts, buffered,
+                          assign_labels(buffered, self.centers))
+        return self
+
+    def assign(self, chunks) -> iter:
+        """
+        Final assignment pass: yield the closest center labels of every
+        chunk of the iterator
+        """
+        for chunk in chunks:
+            yield assign_labels(self.as_chunk(chunk), self.centers)
+
+    def inertia(self, chunks) -> float:
+        """Return the sum of squared distances of the chunks' points to
+        their closest center"""
+        total = 0.0
+        for chunk in chunks:
+            chunk = self.as_chunk(chunk)
+            labels = assign_labels(chunk, self.centers)
+            difference = chunk - self.centers[labels]
+            total += np.einsum('ij,ij->', difference, difference)
+        return total
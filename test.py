@@ -1,2 +1,558 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import scipy.sparse as sp
+from submodules.cluster import KMeans, MiniBatchKMeans, generate_vertices, \
+    assign_labels, grouped_sums
+from submodules.generators import generate_points, write_points
+from submodules.metrics import get_metric
+from submodules.history import FitHistory
+from submodules.pipeline import FitCache, cached_fit, fit_key
+from submodules.point_store import save_points, open_points, point_chunks
+from submodules.restarts import run_restarts
+from submodules.streaming import StreamingKMeans
+from submodules.instrumentation import IterationLog
 
 
+def blob_points(n=3000, dimension=3, centers=5, seed=7):
+    """Return (n, dimension) Gaussian blob points for the tests"""
+    return generate_points(n, 'blobs', dimension, seed=seed, centers=centers)
+
+
+class AlgorithmTest(unittest.TestCase):
+
+    def test_algorithms_agree(self):
+        """Lloyd, Hamerly and Elkan fit the same seed to the same state"""
+        points = blob_points()
+        fits = [KMeans(points, 5, algorithm=algorithm, seed=3).fit()
+                for algorithm in KMeans.algorithms]
+        for kmeans in fits[1:]:
+            np.testing.assert_array_equal(kmeans.labels, fits[0].labels)
+            np.testing.assert_allclose(kmeans.centers, fits[0].centers,
+                                       rtol=1e-12)
+            self.assertEqual(kmeans.iterations, fits[0].iterations)
+            self.assertEqual(kmeans.converged, fits[0].converged)
+
+    def test_workers_match_serial_fit(self):
+        points = blob_points(20000)
+        serial = KMeans(points, 5, seed=3).fit()
+        for workers in (2, 4):
+            with self.subTest(workers=workers):
+                threaded = KMeans(points, 5, seed=3, workers=workers,
+                                  chunk_size=1024).fit()
+                np.testing.assert_array_equal(threaded.labels,
+                                              serial.labels)
+                np.testing.assert_allclose(threaded.centers, serial.centers,
+                                           rtol=1e-12)
+                self.assertEqual(threaded.iterations, serial.iterations)
+                sums, counts = grouped_sums(points, threaded.labels, 5)
+                np.testing.assert_allclose(threaded.cluster_sums, sums)
+                np.testing.assert_array_equal(threaded.cluster_counts,
+                                              counts)
+
+    def test_bounded_algorithms_skip_distances(self):
+        points = blob_points()
+        lloyd = KMeans(points, 5, seed=3).fit()
+        hamerly = KMeans(points, 5, algorithm='hamerly', seed=3).fit()
+        self.assertLess(sum(hamerly.distance_counts),
+                        sum(lloyd.distance_counts))
+
+
+class PredictTest(unittest.TestCase):
+
+    def test_tree_matches_distance_kernel(self):
+        points = generate_points(20000, 'uniform', dimension=2, seed=1)
+        kmeans = KMeans(points, 300, seed=3, init='random').fit(5)
+        queries = generate_points(2000, 'uniform', dimension=2, seed=2)
+        labels = kmeans.predict(queries)
+        self.assertIsNotNone(kmeans.center_tree)
+        np.testing.assert_array_equal(
+            labels, assign_labels(queries, kmeans.centers))
+
+    def test_small_batches_skip_the_tree(self):
+        points = generate_points(20000, 'uniform', dimension=2, seed=1)
+        kmeans = KMeans(points, 300, seed=3, init='random')
+        self.assertEqual(kmeans.predict(points[:1])[0],
+                         assign_labels(points[:1], kmeans.centers)[0])
+        self.assertIsNone(kmeans.center_tree)
+
+    def test_tree_follows_the_centers(self):
+        points = generate_points(20000, 'uniform', dimension=2, seed=1)
+        kmeans = KMeans(points, 300, seed=3, init='random')
+        kmeans.predict(points[:2000])
+        tree = kmeans.center_tree
+        kmeans.predict(points[:2000])
+        self.assertIs(kmeans.center_tree, tree)
+        kmeans.fit(2)
+        np.testing.assert_array_equal(
+            kmeans.predict(points[:2000]),
+            assign_labels(points[:2000], kmeans.centers))
+        self.assertIsNot(kmeans.center_tree, tree)
+        kmeans.set_state(kmeans.centers[::-1])
+        np.testing.assert_array_equal(
+            kmeans.predict(points[:2000]),
+            assign_labels(points[:2000], kmeans.centers))
+
+
+class ClusterMembershipTest(unittest.TestCase):
+
+    def test_clusters_hold_labelled_points(self):
+        for algorithm in KMeans.algorithms:
+            with self.subTest(algorithm=algorithm):
+                kmeans = KMeans(blob_points(), 5, algorithm=algorithm,
+                                seed=3)
+                for clusters in kmeans.iterate_cluster(300):
+                    labels = kmeans.labels.copy()
+                    for key, cluster in clusters.items():
+                        np.testing.assert_array_equal(
+                            cluster.indices, np.flatnonzero(labels == key))
+
+    def test_fit_skips_the_sort(self):
+        kmeans = KMeans(blob_points(), 5, seed=3).fit()
+        self.assertIsNone(kmeans.membership.sorted_order)
+        cluster = kmeans.clusters_dictionary[2]
+        self.assertEqual(len(cluster.points),
+                         np.count_nonzero(kmeans.labels == 2))
+        self.assertIsNotNone(kmeans.membership.sorted_order)
+
+
+class MetricTest(unittest.TestCase):
+
+    def test_cosine_rejects_bounds(self):
+        with self.assertRaises(ValueError):
+            KMeans(blob_points(), 5, algorithm='hamerly', metric='cosine')
+
+    def test_cosine_zero_rows_match_predict(self):
+        points = blob_points()
+        points[:50] = 0
+        kmeans = KMeans(points, 5, seed=3, metric='cosine').fit()
+        self.assertTrue(kmeans.converged)
+        np.testing.assert_array_equal(kmeans.labels, kmeans.predict(points))
+
+    def test_metrics_fit_and_predict(self):
+        points = blob_points()
+        for metric in ('sqeuclidean', 'cosine', 'manhattan', 'mahalanobis'):
+            with self.subTest(metric=metric):
+                kmeans = KMeans(points, 5, seed=3, metric=metric).fit()
+                np.testing.assert_array_equal(kmeans.labels,
+                                              kmeans.predict(points))
+                self.assertEqual(kmeans.transform(points[:10]).shape,
+                                 (10, 5))
+
+    def test_incremental_caches_match_prepare(self):
+        extra = blob_points(400, seed=8)
+        for metric in ('sqeuclidean', 'mahalanobis'):
+            with self.subTest(metric=metric):
+                kmeans = KMeans(blob_points(), 5, seed=3, metric=metric)
+                for _ in range(3):
+                    kmeans.add_points(extra)
+                kmeans.remove_points(np.arange(0, 4000, 3))
+                fresh = get_metric(metric)
+                if metric == 'mahalanobis':
+                    # keep the whitening fitted on the initial points
+                    fresh.whitening = kmeans.metric.whitening
+                fresh.prepare(kmeans.points_array)
+                np.testing.assert_allclose(kmeans.metric.point_norms,
+                                           fresh.point_norms, rtol=1e-9)
+                if metric == 'mahalanobis':
+                    np.testing.assert_allclose(kmeans.metric.whitened,
+                                               fresh.whitened, rtol=1e-9)
+
+
+class PrecisionTest(unittest.TestCase):
+
+    def test_float32_far_from_origin_matches_float64(self):
+        base = generate_points(4000, 'uniform', dimension=3, seed=1)
+        for shift in (100, 1000):
+            points = base + shift
+            for algorithm in KMeans.algorithms:
+                with self.subTest(shift=shift, algorithm=algorithm):
+                    reference = KMeans(points, 12, algorithm=algorithm,
+                                       seed=3).fit()
+                    kmeans = KMeans(points, 12, algorithm=algorithm,
+                                    seed=3, dtype=np.float32).fit()
+                    self.assertTrue(kmeans.converged)
+                    self.assertEqual(kmeans.iterations,
+                                     reference.iterations)
+                    np.testing.assert_array_equal(kmeans.labels,
+                                                  reference.labels)
+                    np.testing.assert_allclose(kmeans.centers,
+                                               reference.centers, atol=1e-3)
+
+    def test_centered_points_keep_the_input_frame(self):
+        points = blob_points() + 1000
+        reference = KMeans(points, 5, seed=3).fit()
+        kmeans = KMeans(points, 5, seed=3, dtype=np.float32).fit()
+        self.assertIsNotNone(kmeans.point_set.offset)
+        self.assertEqual(kmeans.centers.dtype, np.float32)
+        np.testing.assert_array_equal(kmeans.predict(points),
+                                      reference.labels)
+        np.testing.assert_allclose(kmeans.transform(points[:10]),
+                                   reference.transform(points[:10]),
+                                   atol=1e-3)
+        np.testing.assert_allclose(kmeans.transform(), reference.transform(),
+                                   atol=1e-3)
+        restored = KMeans(points, 5, seed=11, dtype=np.float32).set_state(
+            reference.centers)
+        np.testing.assert_allclose(restored.centers, reference.centers,
+                                   rtol=1e-6)
+        self.assertIsNone(KMeans(points, 5, dtype=np.float32,
+                                 center_points=False).point_set.offset)
+
+
+class GroupedSumsTest(unittest.TestCase):
+
+    def test_sums_match_per_cluster_sums(self):
+        rng = np.random.default_rng(2)
+        for dimension in (1, 3, 8, 64):
+            for dtype in (np.float32, np.float64):
+                with self.subTest(dimension=dimension, dtype=dtype):
+                    points = rng.normal(size=(500, dimension)).astype(dtype)
+                    labels = rng.integers(6, size=500)
+                    sums, counts = grouped_sums(points, labels, 7)
+                    self.assertEqual(sums.dtype, np.float64)
+                    np.testing.assert_array_equal(
+                        counts, np.bincount(labels, minlength=7))
+                    for key in range(7):
+                        np.testing.assert_allclose(
+                            sums[key], points[labels == key].sum(
+                                axis=0, dtype=np.float64), atol=1e-9)
+
+    def test_high_dimensional_fit(self):
+        points = blob_points(1000, dimension=40, centers=4)
+        kmeans = KMeans(points, 4, seed=3).fit()
+        for key in range(4):
+            np.testing.assert_allclose(
+                kmeans.centers[key],
+                points[kmeans.labels == key].mean(axis=0))
+
+
+class IterationLogTest(unittest.TestCase):
+
+    def test_inertia_is_opt_in(self):
+        plain, tracked = IterationLog(), IterationLog(inertia=True)
+        KMeans(blob_points(), 5, seed=3, callbacks=[plain]).fit()
+        kmeans = KMeans(blob_points(), 5, seed=3, callbacks=[tracked]).fit()
+        self.assertEqual(len(plain), kmeans.iterations + 1)
+        self.assertTrue(all(stats.inertia is None for stats in plain.stats))
+        self.assertAlmostEqual(tracked.stats[-1].inertia, kmeans.inertia)
+        self.assertTrue(tracked.stats[-1].converged)
+
+
+class MiniBatchTest(unittest.TestCase):
+
+    def test_stops_by_default(self):
+        points = blob_points(20000, centers=10)
+        kmeans = MiniBatchKMeans(points, 10, batch_size=512, seed=3).fit(500)
+        self.assertTrue(kmeans.converged)
+        self.assertLess(kmeans.iterations, 500)
+        reference = KMeans(points, 10, seed=3).fit()
+        self.assertLess(kmeans.inertia, 1.05 * reference.inertia)
+
+    def test_tol_stops_fit(self):
+        kmeans = MiniBatchKMeans(blob_points(), 5, batch_size=256, seed=3,
+                                 tol=1e-2, max_no_improvement=None).fit(1000)
+        self.assertTrue(kmeans.converged)
+        self.assertLess(kmeans.iterations, 1000)
+
+    def test_inertia_stop_can_be_disabled(self):
+        kmeans = MiniBatchKMeans(blob_points(), 5, batch_size=256, seed=3,
+                                 max_no_improvement=None).fit(50)
+        self.assertFalse(kmeans.converged)
+        self.assertEqual(kmeans.iterations, 50)
+
+    def test_rejects_median_update(self):
+        with self.assertRaises(ValueError):
+            MiniBatchKMeans(blob_points(), 5, metric='manhattan')
+
+
+class StreamingTest(unittest.TestCase):
+
+    def test_stream_matches_full_fit(self):
+        points = blob_points(20000)
+        chunks = np.array_split(points, 40)
+        streaming = StreamingKMeans(5, seed=3).fit(chunks)
+        self.assertEqual(streaming.points_seen, len(points))
+        reference = KMeans(points, 5, seed=3).fit()
+        self.assertLess(streaming.inertia(chunks),
+                        1.01 * reference.inertia)
+        labels = np.concatenate(list(streaming.assign(chunks)))
+        np.testing.assert_array_equal(
+            labels, assign_labels(points, streaming.centers))
+
+    def test_short_stream_seeds_from_the_buffer(self):
+        streaming = StreamingKMeans(5, seed=3).fit(
+            np.array_split(blob_points(30), 3))
+        self.assertEqual(streaming.centers.shape, (5, 3))
+        self.assertEqual(streaming.center_counts.sum(), 30)
+
+    def test_rejects_unknown_init(self):
+        with self.assertRaises(ValueError):
+            StreamingKMeans(5, init='farthest')
+
+
+class RunningSumsTest(unittest.TestCase):
+
+    def assert_sums_match_labels(self, kmeans):
+        sums, counts = grouped_sums(kmeans.points_array, kmeans.labels,
+                                    kmeans.k)
+        np.testing.assert_allclose(kmeans.cluster_sums, sums, rtol=1e-9,
+                                   atol=1e-9)
+        np.testing.assert_array_equal(kmeans.cluster_counts, counts)
+
+    def test_add_and_remove_points(self):
+        extra = blob_points(400, seed=8)
+        for algorithm in KMeans.algorithms:
+            with self.subTest(algorithm=algorithm):
+                kmeans = KMeans(blob_points(), 5, algorithm=algorithm,
+                                seed=3).fit()
+                self.assert_sums_match_labels(kmeans)
+                indices = kmeans.add_points(extra)
+                self.assertEqual(len(kmeans.labels), 3400)
+                self.assert_sums_match_labels(kmeans)
+                kmeans.remove_points(indices[::2])
+                kmeans.remove_points(np.arange(0, 3000, 7))
+                self.assert_sums_match_labels(kmeans)
+                kmeans.fit()
+                self.assert_sums_match_labels(kmeans)
+
+    def test_warm_start_assigns_before_adding(self):
+        points = blob_points()
+        extra = blob_points(400, seed=8)
+        centers = KMeans(points, 5, seed=3).fit().centers
+        kmeans = KMeans(points, 5, init=centers)
+        kmeans.add_points(extra)
+        every_point = np.concatenate((points, extra))
+        labels = assign_labels(every_point, centers)
+        np.testing.assert_array_equal(kmeans.labels, labels)
+        sums, counts = grouped_sums(every_point, labels, 5)
+        np.testing.assert_allclose(kmeans.centers, sums / counts[:, None])
+
+    def test_set_state_without_labels_reassigns(self):
+        points = blob_points()
+        centers = KMeans(points, 5, seed=3).fit().centers
+        for algorithm in KMeans.algorithms:
+            with self.subTest(algorithm=algorithm):
+                kmeans = KMeans(points, 5, algorithm=algorithm,
+                                seed=11).fit()
+                kmeans.set_state(centers)
+                kmeans.remove_points(np.arange(10))
+                np.testing.assert_array_equal(
+                    kmeans.labels, assign_labels(points[10:], centers))
+                self.assert_sums_match_labels(kmeans)
+
+
+class FitHistoryTest(unittest.TestCase):
+
+    def test_replay_matches_live_fit(self):
+        points = blob_points()
+        live = KMeans(points, 5, seed=3)
+        states = [(live.centers.copy(), live.labels.copy()) for _ in
+                  live.iterate_cluster(300)]
+        history = FitHistory.record_fit(KMeans(points, 5, seed=3))
+        with tempfile.TemporaryDirectory() as directory:
+            history = FitHistory.load(history.save(
+                os.path.join(directory, 'history.npz')))
+        self.assertEqual(history.iterations, len(states))
+        kmeans = KMeans(points, 5, init=history.initial_centers)
+        replayed = [(kmeans.centers.copy(), kmeans.labels.copy()) for _ in
+                    history.replay(kmeans)]
+        self.assertEqual(len(replayed), len(states))
+        for (centers, labels), (live_centers, live_labels) in zip(
+                replayed, states):
+            np.testing.assert_array_equal(labels, live_labels)
+            np.testing.assert_allclose(centers, live_centers, rtol=1e-6)
+        np.testing.assert_array_equal(kmeans.labels, live.labels)
+        np.testing.assert_allclose(kmeans.centers, live.centers, rtol=1e-6)
+        self.assertEqual(kmeans.converged, live.converged)
+
+    def test_partial_replay(self):
+        history = FitHistory.record_fit(KMeans(blob_points(), 5, seed=3))
+        kmeans = KMeans(blob_points(), 5, init=history.initial_centers)
+        # frames decode the labels in place, keep a copy of each
+        frames = [labels.copy() for _, labels in history.frames()]
+        for index, _ in enumerate(history.replay(kmeans, 1, 3), start=1):
+            np.testing.assert_array_equal(kmeans.labels, frames[index])
+        self.assertEqual(index, 2)
+
+    def test_mini_batch_frames_hold_batch_labels(self):
+        kmeans = MiniBatchKMeans(blob_points(), 5, batch_size=256, seed=3)
+        history = FitHistory.record_fit(kmeans, 20)
+        counts = [np.count_nonzero(np.bincount(labels, minlength=5)) for
+                  _, labels in history.frames()]
+        self.assertTrue(all(count == 5 for count in counts))
+
+
+class FitCacheTest(unittest.TestCase):
+
+    def test_cached_fit_records_once(self):
+        points = blob_points()
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FitCache(directory)
+            kmeans, history = cached_fit(points, 5, seed=3, cache=cache)
+            self.assertEqual(len(cache.entries()), 1)
+            cached, cached_history = cached_fit(points, 5, seed=3,
+                                                cache=cache)
+            self.assertEqual(len(cache.entries()), 1)
+            self.assertEqual(cached_history.iterations, history.iterations)
+            np.testing.assert_array_equal(cached.centers, kmeans.centers)
+            cached_fit(points, 5, seed=4, cache=cache)
+            self.assertEqual(len(cache.entries()), 2)
+        self.assertNotEqual(fit_key(points, 5, seed=3),
+                            fit_key(points, 5, seed=3, algorithm='elkan'))
+
+    def test_evicts_least_recently_used(self):
+        history = FitHistory.record_fit(KMeans(blob_points(), 5, seed=3))
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FitCache(directory)
+            size = os.path.getsize(cache.put('first', history))
+            cache.put('second', history)
+            cache.max_bytes = int(2.5 * size)
+            os.utime(cache.path('first'), (1000, 1000))
+            os.utime(cache.path('second'), (2000, 2000))
+            # reading the oldest entry makes it the most recently used
+            self.assertIsNotNone(cache.get('first'))
+            cache.put('third', history)
+            self.assertIsNone(cache.get('second'))
+            self.assertIsNotNone(cache.get('first'))
+            self.assertIsNotNone(cache.get('third'))
+            cache.max_bytes = 0
+            cache.put('fourth', history)
+            self.assertEqual([path for _, _, path in cache.entries()],
+                             [cache.path('fourth')])
+
+
+class RestartTest(unittest.TestCase):
+
+    def test_returns_best_restart(self):
+        points = blob_points()
+        kmeans, results = run_restarts(points, 5, n_init=3, workers=2,
+                                       seed=1)
+        self.assertEqual(len(results), 3)
+        best = min(results, key=lambda result: result.inertia)
+        self.assertAlmostEqual(kmeans.inertia, best.inertia)
+        np.testing.assert_allclose(kmeans.centers, best.centers)
+        self.assertEqual(kmeans.converged, best.converged)
+        self.assertTrue(kmeans.converged)
+        self.assertEqual(kmeans.iterations, best.iterations)
+        # every restart is a plain KMeans fit of its seed
+        serial = KMeans(points, 5, seed=best.seed).fit()
+        self.assertAlmostEqual(serial.inertia, best.inertia)
+
+    def test_point_file_keeps_float32(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = save_points(os.path.join(directory, 'points.npy'),
+                               blob_points())
+            kmeans, _ = run_restarts(path, 5, n_init=2, workers=2, seed=1)
+        self.assertEqual(kmeans.dtype, np.float32)
+
+    def test_rejects_sparse_points(self):
+        with self.assertRaises(ValueError):
+            run_restarts(sp.csr_matrix(blob_points()), 5, n_init=2)
+
+
+class SparseTest(unittest.TestCase):
+
+    def sparse_points(self):
+        rng = np.random.default_rng(5)
+        points = blob_points(2000, dimension=40, centers=4)
+        points[rng.random(points.shape) < 0.7] = 0
+        return points
+
+    def test_sparse_matches_dense(self):
+        points = self.sparse_points()
+        for algorithm in KMeans.algorithms:
+            with self.subTest(algorithm=algorithm):
+                dense = KMeans(points, 4, algorithm=algorithm, seed=3).fit()
+                sparse = KMeans(sp.csr_matrix(points), 4,
+                                algorithm=algorithm, seed=3).fit()
+                np.testing.assert_array_equal(sparse.labels, dense.labels)
+                np.testing.assert_allclose(sparse.centers, dense.centers,
+                                           rtol=1e-9, atol=1e-12)
+                np.testing.assert_array_equal(
+                    sparse.predict(sp.csr_matrix(points[:100])),
+                    dense.predict(points[:100]))
+
+    def test_sparse_points_dictionary(self):
+        points = self.sparse_points()
+        dense = KMeans(points, 4, seed=3, chunk_size=512)
+        sparse = KMeans(sp.csr_matrix(points), 4, seed=3, chunk_size=512)
+        self.assertEqual(list(sparse.points_dictionary),
+                         list(dense.points_dictionary))
+
+
+class PointStoreTest(unittest.TestCase):
+
+    def test_point_file_keeps_its_dtype(self):
+        points = blob_points()
+        with tempfile.TemporaryDirectory() as directory:
+            path = save_points(os.path.join(directory, 'points.npy'), points)
+            kmeans = KMeans(open_points(path), 5, seed=3).fit()
+            self.assertEqual(kmeans.dtype, np.float32)
+            self.assertEqual(kmeans.centers.dtype, np.float32)
+            self.assertEqual(kmeans.points_array.dtype, np.float32)
+            np.testing.assert_array_equal(
+                np.concatenate(list(point_chunks(path, 512))),
+                points.astype(np.float32))
+
+    def test_checkpoint_round_trip(self):
+        points = blob_points()
+        kmeans = KMeans(points, 5, seed=3).fit()
+        with tempfile.TemporaryDirectory() as directory:
+            kmeans.save_checkpoint(directory)
+            restored = KMeans(points, 5, seed=11).load_checkpoint(directory)
+            np.testing.assert_array_equal(restored.centers, kmeans.centers)
+            np.testing.assert_array_equal(restored.labels, kmeans.labels)
+            self.assertEqual(
+                [len(cluster.points) for cluster in
+                 restored.clusters_dictionary.values()],
+                [len(cluster.points) for cluster in
+                 kmeans.clusters_dictionary.values()])
+            restored.fit()
+            np.testing.assert_allclose(restored.centers, kmeans.centers)
+
+
+class GeneratorTest(unittest.TestCase):
+
+    def test_exact_count_and_labels(self):
+        for distribution in ('triangular', 'uniform', 'blobs',
+                             'anisotropic'):
+            with self.subTest(distribution=distribution):
+                points, labels = generate_points(
+                    1001, distribution, dimension=4, seed=1,
+                    return_labels=True)
+                self.assertEqual(points.shape, (1001, 4))
+                if labels is not None:
+                    self.assertEqual(len(labels), 1001)
+
+    def test_unique_rows(self):
+        # 2000 points on a 100 x 100 integer grid collide often
+        points = generate_points(2000, 'uniform', dimension=2, seed=1,
+                                 unique=True, low=0, high=100,
+                                 dtype=np.int64)
+        self.assertEqual(len(np.unique(points, axis=0)), 2000)
+
+    def test_seed_is_reproducible(self):
+        np.testing.assert_array_equal(generate_points(500, seed=4),
+                                      generate_points(500, seed=4))
+
+    def test_write_points_matches_generate_points(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = write_points(os.path.join(directory, 'points.npy'), 1000,
+                                'blobs', dimension=3, seed=2, chunk_size=128,
+                                dtype=np.float64)
+            np.testing.assert_array_equal(
+                np.load(path), generate_points(1000, 'blobs', dimension=3,
+                                               seed=2))
+
+    def test_vertices_small_limit(self):
+        vertices = generate_vertices(5000, 1)
+        self.assertEqual(len(set(vertices)), 5000)
+        points = np.array(vertices)
+        self.assertTrue(np.all(np.abs(points[:, 0]) <= 1.6))
+        self.assertTrue(np.all(np.abs(points[:, 1]) <= 1))
+
+
+if __name__ == '__main__':
+    unittest.main()